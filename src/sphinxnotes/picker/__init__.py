@@ -29,6 +29,9 @@ def setup(app):
 
     app.add_config_value('picker_config', {}, '')
     app.add_config_value('picker_patterns', {'*': ['.*']}, '')
+    app.add_config_value('picker_keyword_cache_size', 65536, '')
+    app.add_config_value('picker_build_report', False, '')
+    app.add_config_value('picker_export_previews', False, '')
 
     app.connect('config-inited', on_config_inited)
     app.connect('env-get-outdated', on_env_get_outdated)
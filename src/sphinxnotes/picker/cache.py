@@ -7,17 +7,51 @@ sphinxnotes.picker.cache
 """
 
 from __future__ import annotations
-from dataclasses import dataclass
+from typing import Any, Iterator
+from dataclasses import dataclass, field, asdict
+import os
+from os import path
+import json
+import shutil
+import zlib
+from hashlib import sha1
 
-from .snippets import Snippet
 from .utils.pdict import PDict
+from .utils.stats import stats
+from . import indexfile
+
+
+@dataclass(frozen=True)
+class Record(object):
+    """
+    Plain data of a snippet (see :mod:`.snippets`) that persisted in cache.
+
+    Unlike snippets, it can be read without importing docutils, pygments or
+    Sphinx, which slow down the startup of CLI.
+    """
+
+    #: Kind of snippet: "document", "section" or "code"
+    kind: str
+    docname: str
+    file: str
+    lineno: tuple[int, int]
+    source: list[str]
+    text: list[str]
+    refid: str | None
+    #: Title of document or section
+    title: str | None = None
+    #: Language and description of code
+    lang: str | None = None
+    desc: str | None = None
+    #: Dependent files of document
+    deps: list[str] = field(default_factory=list)
 
 
 @dataclass(frozen=True)
 class Item(object):
     """Item of snippet cache."""
 
-    snippet: Snippet
+    snippet: Record
     tags: str
     excerpt: str
     titlepath: list[str]
@@ -25,71 +59,273 @@ class Item(object):
 
 
 DocID = tuple[str, str]  # (project, docname)
-IndexID = str  # UUID
+IndexID = str  # Hex digest derived from identity of item
 Index = tuple[str, str, list[str], list[str]]  # (tags, excerpt, titlepath, keywords)
+Location = tuple[str, int, int, int]  # (item name, offset, length, checksum)
 
 
 class Cache(PDict[DocID, list[Item]]):
     """A DocID -> list[Item] Cache."""
 
+    VERSION = 7
+    #: Items are stored as JSON lines, see :meth:`serialize`.
+    ITEM_SUFFIX = '.jsonl'
+
     indexes: dict[IndexID, Index]
     index_id_to_doc_id: dict[IndexID, tuple[DocID, int]]
     doc_id_to_index_ids: dict[DocID, list[IndexID]]
     num_snippets_by_project: dict[str, int]
     num_snippets_by_docid: dict[DocID, int]
+    #: (offset, length, checksum) of every serialized item in the item file
+    doc_id_to_spans: dict[DocID, list[tuple[int, int, int]]]
+    #: Shortest prefix of digest -> digest of item -> index ID, see
+    #: :meth:`assign_index_ids`
+    digest_groups: dict[str, dict[str, IndexID | None]]
 
-    def __init__(self, dirname: str) -> None:
+    #: Minimal width of index ID
+    ID_WIDTH = 7
+
+    def __init__(self, dirname: str, backend: str = 'pickle') -> None:
+        self.post_clear()
+        super().__init__(dirname, backend)
+
+    def post_clear(self) -> None:
+        """Overwrite PDict.post_clear."""
         self.indexes = {}
         self.index_id_to_doc_id = {}
         self.doc_id_to_index_ids = {}
         self.num_snippets_by_project = {}
         self.num_snippets_by_docid = {}
-        super().__init__(dirname)
+        self.doc_id_to_spans = {}
+        self.digest_groups = {}
+
+    def summarize(
+        self, key: DocID, value: list[Item]
+    ) -> tuple[list[tuple[int, int, int]], list[tuple[str, Index]]]:
+        """
+        Overwrite PDict.summarize, return spans of items (set by
+        :meth:`serialize`), and digests and indexes of items.
+        """
+        return self.doc_id_to_spans[key], self.digest_indexes(key, value)
+
+    def digest_indexes(self, key: DocID, value: list[Item]) -> list[tuple[str, Index]]:
+        """Return digests (see :meth:`digest`) and indexes of items."""
+        result = []
+        occurrences: dict[tuple[str, ...], int] = {}
+        for item in value:
+            identity = self.identify(key, item)
+            # Distinguish items that have the same identity in a document
+            nth = occurrences[identity] = occurrences.get(identity, -1) + 1
+            index = (item.tags, item.excerpt, item.titlepath, item.keywords)
+            result.append((self.digest(identity, nth), index))
+        return result
 
     def post_dump(self, key: DocID, value: list[Item]) -> None:
         """Overwrite PDict.post_dump."""
+        self.add_indexes(key, self.digest_indexes(key, value))
+
+    def post_load(
+        self,
+        key: DocID,
+        summary: tuple[list[tuple[int, int, int]], list[tuple[str, Index]]],
+    ) -> None:
+        """Overwrite PDict.post_load."""
+        spans, entries = summary
+        self.doc_id_to_spans[key] = spans
+        self.add_indexes(key, entries)
 
+    def add_indexes(self, key: DocID, entries: list[tuple[str, Index]]) -> None:
+        """Add indexes of document, the old ones are replaced."""
         # Remove old indexes and index IDs if exists
-        for old_index_id in self.doc_id_to_index_ids.setdefault(key, []):
-            del self.index_id_to_doc_id[old_index_id]
-            del self.indexes[old_index_id]
+        released = self.release_index_ids(self.doc_id_to_index_ids.get(key, []))
+        self.doc_id_to_index_ids[key] = []
 
         # Add new index to every where
-        for i, item in enumerate(value):
-            index_id = self.gen_index_id()
-            self.indexes[index_id] = (
-                item.tags,
-                item.excerpt,
-                item.titlepath,
-                item.keywords,
-            )
+        for i, (digest, index) in enumerate(entries):
+            group = self.digest_groups.setdefault(digest[: self.ID_WIDTH], {})
+            group[digest] = None
+            self.assign_index_ids(group)
+            index_id = group[digest]
+            assert index_id is not None
+            self.indexes[index_id] = index
             self.index_id_to_doc_id[index_id] = (key, i)
             self.doc_id_to_index_ids[key].append(index_id)
+        for prefix in released:
+            if group := self.digest_groups.get(prefix):
+                self.assign_index_ids(group)
 
-        # Update statistic
+        # Update statistic, the document may be dumped without purging
+        old_num = self.num_snippets_by_docid.get(key, 0)
         if key[0] not in self.num_snippets_by_project:
             self.num_snippets_by_project[key[0]] = 0
-        self.num_snippets_by_project[key[0]] += len(value)
-        if key not in self.num_snippets_by_docid:
-            self.num_snippets_by_docid[key] = 0
-        self.num_snippets_by_docid[key] += len(value)
+        self.num_snippets_by_project[key[0]] += len(entries) - old_num
+        self.num_snippets_by_docid[key] = len(entries)
 
     def post_purge(self, key: DocID, value: list[Item]) -> None:
         """Overwrite PDict.post_purge."""
 
+        if key not in self.doc_id_to_index_ids:
+            return  # Already purged
+
         # Purge indexes
-        for index_id in self.doc_id_to_index_ids.pop(key):
-            del self.index_id_to_doc_id[index_id]
-            del self.indexes[index_id]
+        released = self.release_index_ids(self.doc_id_to_index_ids.pop(key))
+        for prefix in released:
+            if group := self.digest_groups.get(prefix):
+                self.assign_index_ids(group)
+        self.doc_id_to_spans.pop(key, None)
 
         # Update statistic
         self.num_snippets_by_project[key[0]] -= len(value)
-        if self.num_snippets_by_project[key[0]] == 0:
+        if self.num_snippets_by_project[key[0]] <= 0:
             del self.num_snippets_by_project[key[0]]
         self.num_snippets_by_docid[key] -= len(value)
-        if self.num_snippets_by_docid[key] == 0:
+        if self.num_snippets_by_docid[key] <= 0:
             del self.num_snippets_by_docid[key]
 
+    def serialize(self, key: DocID, value: list[Item]) -> bytes:
+        """
+        Overwrite PDict.serialize.
+
+        Items are encoded to JSON one by one, so that a single item can be
+        loaded without decoding the whole document, see :meth:`load_item`.
+        """
+        buf = bytearray()
+        spans = []
+        for item in value:
+            data = json.dumps(asdict(item), ensure_ascii=False).encode() + b'\n'
+            spans.append((len(buf), len(data), zlib.crc32(data)))
+            buf.extend(data)
+        self.doc_id_to_spans[key] = spans
+        return bytes(buf)
+
+    def deserialize(self, key: DocID, data: bytes) -> list[Item]:
+        """Overwrite PDict.deserialize."""
+        return [self.decode_item(line) for line in data.splitlines()]
+
+    @staticmethod
+    def decode_item(data: bytes) -> Item:
+        obj: dict[str, Any] = json.loads(data)
+        snippet = obj.pop('snippet')
+        snippet['lineno'] = tuple(snippet['lineno'])
+        return Item(snippet=Record(**snippet), **obj)
+
+    def post_commit(self, changed: bool) -> None:
+        """Overwrite PDict.post_commit, emit the index file for CLI."""
+        if not changed and self._indexfile_is_valid():
+            return  # Keep index file and files derived from it untouched
+        stat = {
+            'num_snippets_by_project': self.num_snippets_by_project,
+            'num_docs': len(self.num_snippets_by_docid),
+        }
+        rows = (
+            (index_id, index, doc_id, self.location(index_id))
+            for index_id, index, doc_id in self.iter_indexes()
+        )
+        with stats.timer('indexfile'):
+            indexfile.dump(self.indexfile(), rows, stat)
+        # Rendered outputs of the old index file are outdated
+        shutil.rmtree(self.renderdir(), ignore_errors=True)
+
+    def iter_indexes(self) -> Iterator[tuple[IndexID, Index, DocID]]:
+        """Iterate over all indexes and the DocID they belong to."""
+        for index_id, index in self.indexes.items():
+            doc_id, _ = self.index_id_to_doc_id[index_id]
+            yield index_id, index, doc_id
+
+    def indexfile(self) -> str:
+        return path.join(self.dirname, indexfile.FILENAME)
+
+    def _indexfile_is_valid(self) -> bool:
+        try:
+            indexfile.IndexFile(self.indexfile()).close()
+        except (OSError, ValueError):
+            return False  # Missing or in unsupported version
+        return True
+
+    def renderdir(self) -> str:
+        """Return directory where CLI keeps rendered ``list`` outputs."""
+        return path.join(self.dirname, 'rendered')
+
+    def previewdir(self) -> str:
+        """Return directory of preview files, see :meth:`export_previews`."""
+        return path.join(self.dirname, 'previews')
+
+    def export_previews(self) -> None:
+        """
+        Write source and text of every snippet to ``<index ID>.src`` and
+        ``<index ID>.text`` under :meth:`previewdir`, so that integrations
+        can preview snippets by reading files rather than invoking CLI.
+
+        Only documents changed since the last export are exported, and
+        previews of removed snippets are removed. Files are written to
+        temporary files then renamed, so that readers never see a partially
+        written file.
+        """
+        dirname = self.previewdir()
+        manifestfile = path.join(dirname, 'manifest.json')
+        try:
+            with open(manifestfile, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        os.makedirs(dirname, exist_ok=True)
+
+        # Item name -> [digest of item, index IDs] when it is exported, index
+        # IDs may be renamed without touching the item, see assign_index_ids()
+        exported = {}
+        for doc_id, index_ids in self.doc_id_to_index_ids.items():
+            name = self.itemname(doc_id)
+            # Checksums of serialized items stand for the content of document
+            digest = sha1(json.dumps(self.doc_id_to_spans[doc_id]).encode())
+            exported[name] = [digest.hexdigest(), index_ids]
+            if manifest.get(name) == exported[name]:
+                continue
+            for index_id, item in zip(index_ids, self[doc_id], strict=True):
+                for ext, lines in [
+                    ('src', item.snippet.source),
+                    ('text', item.snippet.text),
+                ]:
+                    fn = path.join(dirname, f'{index_id}.{ext}')
+                    tmpfile = f'{fn}.{os.getpid()}.tmp'
+                    with open(tmpfile, 'w', encoding='utf-8') as f:
+                        f.write('\n'.join(lines) + '\n')
+                    os.replace(tmpfile, fn)
+
+        for fn in os.listdir(dirname):
+            index_id, ext = path.splitext(fn)
+            if ext in ('.src', '.text') and index_id not in self.indexes:
+                os.remove(path.join(dirname, fn))
+
+        tmpfile = f'{manifestfile}.{os.getpid()}.tmp'
+        with open(tmpfile, 'w') as f:
+            json.dump(exported, f)
+        os.replace(tmpfile, manifestfile)
+
+    def update_previews(self) -> None:
+        """Load the latest cache and export outdated previews."""
+        # Don't race with dumps of other processes
+        with self._lock():
+            self.load()
+            self.export_previews()
+
+    def location(self, key: IndexID) -> Location:
+        """Return where the serialized item of given index ID is stored."""
+        doc_id, item_index = self.index_id_to_doc_id[key]
+        return (self.itemname(doc_id), *self.doc_id_to_spans[doc_id][item_index])
+
+    def load_item(self, loc: Location) -> Item:
+        """
+        Load a single item from storage without loading the cache.
+
+        :raise ValueError: If the item is changed since the location was
+           taken, for example, the index file is outdated.
+        """
+        name, offset, length, checksum = loc
+        data = self._backend.read_range(name, offset, length)
+        if zlib.crc32(data) != checksum:
+            raise ValueError(f'item at {loc} is changed')
+        return self.decode_item(data)
+
     def get_by_index_id(self, key: IndexID) -> Item | None:
         """Like get(), but use IndexID as key."""
         doc_id, item_index = self.index_id_to_doc_id.get(key, (None, None))
@@ -97,11 +333,64 @@ class Cache(PDict[DocID, list[Item]]):
             return None
         return self[doc_id][item_index]
 
-    def gen_index_id(self) -> str:
-        """Generate unique ID for index."""
-        import uuid
+    def identify(self, key: DocID, item: Item) -> tuple[str, ...]:
+        """
+        Return the identity of item, which stays the same across rebuilds as
+        long as the item is not renamed or moved to other document.
+        """
+        # For code, refid usually comes from its parent section, the excerpt
+        # (which contains the description of code) makes it distinguishable.
+        return (*key, item.tags, item.snippet.refid or '', item.excerpt)
+
+    def digest(self, identity: tuple[str, ...], nth: int = 0) -> str:
+        """Return the digest of item's identity, index ID is a prefix of it."""
+        hasher = sha1()
+        for part in (*identity, str(nth)):
+            hasher.update(part.encode())
+            hasher.update(b'\0')
+        return hasher.hexdigest()
 
-        return uuid.uuid4().hex[:7]
+    def assign_index_ids(self, group: dict[str, IndexID | None]) -> None:
+        """
+        Assign index IDs to digests that share the same shortest prefix, and
+        rename the assigned ones if needed.
+
+        All members of group use the shortest prefixes that are unique in the
+        group, so the IDs do not depend on the order in which items are added.
+        """
+        width = self.ID_WIDTH
+        while len({digest[:width] for digest in group}) != len(group):
+            width += 1
+        for digest, old_index_id in group.items():
+            index_id = group[digest] = digest[:width]
+            if old_index_id is None or old_index_id == index_id:
+                continue
+            self.indexes[index_id] = self.indexes.pop(old_index_id)
+            doc_id, i = self.index_id_to_doc_id[index_id] = self.index_id_to_doc_id.pop(
+                old_index_id
+            )
+            self.doc_id_to_index_ids[doc_id][i] = index_id
+
+    def release_index_ids(self, index_ids: list[IndexID]) -> set[str]:
+        """
+        Remove indexes of given index IDs, return the shortest prefixes of
+        groups they belong to. The remaining members of groups should be
+        reassigned by :meth:`assign_index_ids` later.
+        """
+        prefixes = set()
+        for index_id in index_ids:
+            del self.index_id_to_doc_id[index_id]
+            del self.indexes[index_id]
+            prefix = index_id[: self.ID_WIDTH]
+            group = self.digest_groups[prefix]
+            for digest, assigned in group.items():
+                if assigned == index_id:
+                    del group[digest]
+                    break
+            if not group:
+                del self.digest_groups[prefix]
+            prefixes.add(prefix)
+        return prefixes
 
     def stringify(self, key: DocID, value: list[Item]) -> str:
         """Overwrite PDict.stringify."""
@@ -16,17 +16,25 @@ import sys
 import os
 from os import path
 import argparse
-from typing import Iterable
+from typing import Any, Callable, Iterable
+from itertools import islice
+from contextlib import ExitStack, suppress
 from textwrap import dedent
-from shutil import get_terminal_size
+from shutil import get_terminal_size, rmtree
 import posixpath
+import json
+from hashlib import sha1
 
 from xdg.BaseDirectory import xdg_config_home
 
-from .snippets import Document
 from .config import Config
-from .cache import Cache, IndexID, Index
-from .table import tablify, COLUMNS
+from .cache import Cache, Item, IndexID, Index, DocID
+from .table import render, COLUMNS
+from . import indexfile
+from .search import MemoryInvertedIndex, search
+from . import fuzzy
+from .frecency import Frecency
+from .utils.matching import patmatch
 
 DEFAULT_CONFIG_FILE = path.join(xdg_config_home, 'sphinxnotes', 'picker', 'conf.py')
 
@@ -75,6 +83,11 @@ def main(argv: list[str] = sys.argv[1:]):
     parser.add_argument(
         '-c', '--config', default=DEFAULT_CONFIG_FILE, help='path to configuration file'
     )
+    parser.add_argument(
+        '--direct',
+        action='store_true',
+        help='do not send request to picker server even if it is running',
+    )
 
     # Init subcommands
     subparsers = parser.add_subparsers()
@@ -102,6 +115,34 @@ def main(argv: list[str] = sys.argv[1:]):
         default='**',
         help='list pickers whose docname matches shell-style glob pattern',
     )
+    listparser.add_argument(
+        '--project', '-p', type=str, help='list pickers of specified project'
+    )
+    listparser.add_argument(
+        '--query',
+        '-q',
+        type=str,
+        help='list pickers that fuzzy match the query, ordered by relevance',
+    )
+    listparser.add_argument(
+        '--sort',
+        '-s',
+        choices=['index', 'frecency'],
+        default='index',
+        help='order of pickers: "index" lists them in the order they are '
+        'indexed, "frecency" lists frequently and recently selected (by "get '
+        '--record") ones first; ignored if --query is given',
+    )
+    listparser.add_argument(
+        '--limit', '-n', type=int, help='maximum number of pickers to list'
+    )
+    listparser.add_argument(
+        '--offset',
+        '-o',
+        type=int,
+        default=0,
+        help='number of pickers to skip before listing, header is always listed',
+    )
     listparser.add_argument(
         '--width',
         '-w',
@@ -109,7 +150,28 @@ def main(argv: list[str] = sys.argv[1:]):
         default=get_terminal_size((120, 0)).columns,
         help='width in characters of output',
     )
-    listparser.set_defaults(func=_on_command_list)
+    listparser.set_defaults(func=_on_command_list, command='list')
+
+    searchparser = subparsers.add_parser(
+        'search',
+        aliases=['f'],
+        formatter_class=HelpFormatter,
+        help='search picker indexes by keywords, ranked by relevance',
+    )
+    searchparser.add_argument(
+        'query', type=str, nargs='+', help='keywords to search, case insensitive'
+    )
+    searchparser.add_argument(
+        '--limit', '-n', type=int, default=20, help='maximum number of results'
+    )
+    searchparser.add_argument(
+        '--width',
+        '-w',
+        type=int,
+        default=get_terminal_size((120, 0)).columns,
+        help='width in characters of output',
+    )
+    searchparser.set_defaults(func=_on_command_search, command='search')
 
     getparser = subparsers.add_parser(
         'get',
@@ -153,8 +215,47 @@ def main(argv: list[str] = sys.argv[1:]):
         action='store_true',
         help='get URL of HTML documentation of picker',
     )
+    getparser.add_argument(
+        '--title', action='store_true', help='get title of picker if it has'
+    )
+    getparser.add_argument(
+        '--all',
+        '-a',
+        action='store_true',
+        help='get all attributes of picker, attributes that are not available '
+        '(such as dependent files of a section) are skipped',
+    )
+    getparser.add_argument(
+        '--json',
+        '-j',
+        action='store_true',
+        help='print attributes of every picker as a line of JSON, all '
+        'attributes (including titlepath and keywords) are printed if none is '
+        'specified',
+    )
+    getparser.add_argument(
+        '--record',
+        action='store_true',
+        help='record the pickers as selected by user, for "list --sort frecency"',
+    )
     getparser.add_argument('index_id', type=str, nargs='+', help='index ID')
-    getparser.set_defaults(func=_on_command_get)
+    getparser.set_defaults(func=_on_command_get, command='get')
+
+    serveparser = subparsers.add_parser(
+        'serve',
+        formatter_class=HelpFormatter,
+        help='run a server that keeps cache in memory and answers list, search '
+        'and get requests of CLI, so that they respond faster',
+    )
+    serveparser.set_defaults(func=_on_command_serve)
+
+    exportparser = subparsers.add_parser(
+        'export-previews',
+        formatter_class=HelpFormatter,
+        help='export outdated preview files (source and text) of pickers and '
+        'print the directory of them',
+    )
+    exportparser.set_defaults(func=_on_command_export_previews)
 
     igparser = subparsers.add_parser(
         'integration',
@@ -208,12 +309,20 @@ def main(argv: list[str] = sys.argv[1:]):
         cfg = Config({})
     else:
         cfg = Config.load(args.config)
-    setattr(args, 'cfg', cfg)
+    args.cfg = cfg
+
+    # Let picker server handle the request if it is running
+    if hasattr(args, 'command') and not args.direct and (resp := _request_server(args)):
+        sys.stdout.write(resp['stdout'])
+        sys.stderr.write(resp['stderr'])
+        sys.exit(resp['status'])
 
-    # Load snippet cache
-    cache = Cache(cfg.cache_dir)
-    cache.load()
-    setattr(args, 'cache', cache)
+    # Snippet cache is loaded on demand, see _get_cache()
+    args.cache = Cache(cfg.cache_dir, cfg.cache_backend)
+    args.cache_loaded = False
+    # Index file is opened on demand, see _open_indexfile()
+    args.idxfile = None
+    args.idxfile_stamp = None
 
     # Call subcommand
     if hasattr(args, 'func'):
@@ -222,48 +331,292 @@ def main(argv: list[str] = sys.argv[1:]):
         parser.print_help()
 
 
+def _get_cache(args: argparse.Namespace) -> Cache:
+    """Load snippet cache on first use."""
+    if not args.cache_loaded:
+        args.cache.load()
+        args.cache_loaded = True
+    return args.cache
+
+
+def _open_indexfile(args: argparse.Namespace) -> indexfile.IndexFile | None:
+    """
+    Open the memory mapped index file, which is preferred to loading the
+    whole cache.
+
+    The opened file is reused until it is replaced by a new dump, and then
+    the loaded cache is dropped too.
+    """
+    filename = args.cache.indexfile()
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns)
+    if stamp == args.idxfile_stamp:
+        return args.idxfile
+
+    if args.idxfile:
+        args.idxfile.close()
+        args.cache = Cache(args.cfg.cache_dir, args.cfg.cache_backend)
+        args.cache_loaded = False
+    try:
+        args.idxfile = indexfile.IndexFile(filename)
+    except (OSError, ValueError):
+        # Index file is missing or in unsupported version
+        args.idxfile = None
+    args.idxfile_stamp = stamp
+    return args.idxfile
+
+
+def _get_item(
+    args: argparse.Namespace, idxfile: indexfile.IndexFile | None, index_id: IndexID
+) -> tuple[Item, DocID] | None:
+    """Return item of given index ID and the DocID it belongs to."""
+    if idxfile:
+        # Only read the requested item from storage
+        if not (found := idxfile.lookup(index_id)):
+            return None
+        (_, _, doc_id), loc = found
+        try:
+            return args.cache.load_item(loc), doc_id
+        except (OSError, ValueError):
+            pass  # Index file is outdated, fallback to the whole cache
+
+    cache = _get_cache(args)
+    if not (item := cache.get_by_index_id(index_id)):
+        return None
+    doc_id, _ = cache.index_id_to_doc_id[index_id]
+    return item, doc_id
+
+
 def _on_command_stat(args: argparse.Namespace):
-    cache = args.cache
+    if idxfile := _open_indexfile(args):
+        stat = idxfile.stat()
+        num_snippets_by_project = stat['num_snippets_by_project']
+        num_docs = stat['num_docs']
+    else:
+        cache = _get_cache(args)
+        num_snippets_by_project = cache.num_snippets_by_project
+        num_docs = len(cache.num_snippets_by_docid)
 
-    num_projects = len(cache.num_snippets_by_project)
-    num_docs = len(cache.num_snippets_by_docid)
-    num_snippets = sum(cache.num_snippets_by_project.values())
-    print(f'indexes are loaded from {cache.dirname}')
+    num_projects = len(num_snippets_by_project)
+    num_snippets = sum(num_snippets_by_project.values())
+    print(f'indexes are loaded from {args.cache.dirname}')
     print(f'configuration are loaded from {args.config}')
     print(f'integration files are located at {get_integration_file("")}')
     print('')
     print(
         f'I have {num_projects} project(s), {num_docs} documentation(s) and {num_snippets} snippet(s)'
     )
-    for i, v in cache.num_snippets_by_project.items():
+    for i, v in num_snippets_by_project.items():
         print(f'project {i}:')
         print(f'\t {v} snippets(s)')
 
 
-def _filter_list_items(
-    cache: Cache, tags: str, docname_glob: str
-) -> Iterable[tuple[IndexID, Index]]:
-    # NOTE: Importing is slow, do it on demand.
-    from sphinx.util.matching import patmatch
+def _index_filter(
+    tags: str, project: str | None, docname_glob: str
+) -> Callable[[tuple[IndexID, Index, DocID]], bool] | None:
+    """Return predicate of indexes to be listed, None if all are listed."""
+    if '*' in tags and project is None and docname_glob == '**':
+        return None
 
-    for index_id, index in cache.indexes.items():
+    def accept(row: tuple[IndexID, Index, DocID]) -> bool:
+        _, index, (proj, docname) = row
         # Filter by tags.
         if index[0] not in tags and '*' not in tags:
-            continue
+            return False
+        # Filter by project.
+        if project is not None and proj != project:
+            return False
         # Filter by docname.
-        (_, docname), _ = cache.index_id_to_doc_id[index_id]
-        if not patmatch(docname, docname_glob):
-            continue
+        return patmatch(docname, docname_glob)
+
+    return accept
+
+
+def _filter_list_items(
+    args: argparse.Namespace,
+) -> Iterable[tuple[IndexID, Index]]:
+    if idxfile := _open_indexfile(args):
+        # Index file has secondary indexes for filters
+        rows = idxfile.select(args.tags, args.project, args.docname)
+    else:
+        rows = _get_cache(args).iter_indexes()
+        if accept := _index_filter(args.tags, args.project, args.docname):
+            rows = filter(accept, rows)
+    for index_id, index, _ in rows:
         yield (index_id, index)
 
 
+def _rendered_file(args: argparse.Namespace) -> str | None:
+    """
+    Return path of the rendered output of list command, None if the output
+    is not cacheable.
+
+    Outputs are keyed by generation of index file and the options, and are
+    removed when cache is dumped.
+    """
+    if args.query or not _open_indexfile(args):
+        return None
+    dirname = args.cache.renderdir()
+    key = [
+        args.idxfile_stamp,
+        args.width,
+        args.tags,
+        args.project,
+        args.docname,
+        args.limit,
+        args.offset,
+        args.sort,
+    ]
+    if args.sort == 'frecency':
+        # Outputs are keyed by order of selected pickers as well, and are
+        # removed when the order changes, see _record_selection()
+        dirname = _frecency_renderdir(args)
+        key.append(Frecency(args.cfg.cache_dir).ranked())
+    digest = sha1(json.dumps(key).encode()).hexdigest()
+    return path.join(dirname, digest + '.txt')
+
+
+def _frecency_renderdir(args: argparse.Namespace) -> str:
+    return path.join(args.cache.renderdir(), 'frecency')
+
+
+def _frecency_list_items(
+    args: argparse.Namespace,
+) -> Iterable[tuple[IndexID, Index]]:
+    """Like :func:`_filter_list_items`, but selected pickers come first."""
+    accept = _index_filter(args.tags, args.project, args.docname)
+    idxfile = _open_indexfile(args)
+    listed = set()
+    for index_id in Frecency(args.cfg.cache_dir).ranked():
+        if idxfile:
+            found = idxfile.lookup(index_id)
+            row = found and found[0]
+        else:
+            cache = _get_cache(args)
+            row = index_id in cache.indexes and (
+                index_id,
+                cache.indexes[index_id],
+                cache.index_id_to_doc_id[index_id][0],
+            )
+        # Skip pickers that are removed or filtered out
+        if not row or (accept and not accept(row)):
+            continue
+        listed.add(index_id)
+        yield (index_id, row[1])
+    for index_id, index in _filter_list_items(args):
+        if index_id not in listed:
+            yield (index_id, index)
+
+
 def _on_command_list(args: argparse.Namespace):
-    items = _filter_list_items(args.cache, args.tags, args.docname)
-    for row in tablify(items, args.width):
-        print(row)
+    if rendered := _rendered_file(args):
+        try:
+            with open(rendered, 'r', encoding='utf-8') as f:
+                sys.stdout.write(f.read())
+            return
+        except FileNotFoundError:
+            pass
+
+    if args.query:
+        corpus = _open_indexfile(args) or fuzzy.MemoryCorpus(
+            _get_cache(args).iter_indexes()
+        )
+        accept = _index_filter(args.tags, args.project, args.docname)
+        limit = sys.maxsize if args.limit is None else args.offset + args.limit
+        results = fuzzy.search(corpus, args.query, limit, accept)
+        items = ((index_id, index) for _, (index_id, index, _) in results)
+    elif args.sort == 'frecency':
+        items = _frecency_list_items(args)
+    else:
+        items = _filter_list_items(args)
+    stop = None if args.limit is None else args.offset + args.limit
+    items = islice(items, args.offset, stop)
+
+    # Keep the output for later calls with the same options
+    out = None
+    with ExitStack() as stack:
+        if rendered:
+            tmpfile = f'{rendered}.{os.getpid()}.tmp'
+            # Cache directory may be not writable
+            with suppress(OSError):
+                os.makedirs(path.dirname(rendered), exist_ok=True)
+                out = stack.enter_context(open(tmpfile, 'w', encoding='utf-8'))
+        for chunk in render(items, args.width):
+            sys.stdout.write(chunk)
+            if out:
+                out.write(chunk)
+    if out:
+        # Cache may be dumped meanwhile
+        with suppress(OSError):
+            os.replace(tmpfile, rendered)
+
+
+def _on_command_search(args: argparse.Namespace):
+    index = _open_indexfile(args) or MemoryInvertedIndex(
+        _get_cache(args).iter_indexes()
+    )
+    results = search(index, ' '.join(args.query), args.limit)
+    items = ((index_id, index) for _, (index_id, index, _) in results)
+    for chunk in render(items, args.width):
+        sys.stdout.write(chunk)
+
+
+def _get_attrs(
+    args: argparse.Namespace, index_id: IndexID, item: Item, doc_id: DocID
+) -> dict[str, Any]:
+    """Return all attributes of picker, the keys are used in JSON output."""
+    s = item.snippet
+    url = None
+    if base_url := args.cfg.base_urls.get(doc_id[0]):
+        url = posixpath.join(base_url, doc_id[1] + '.html')
+        if s.refid:
+            url += '#' + s.refid
+    return {
+        'id': index_id,
+        'project': doc_id[0],
+        'tags': item.tags,
+        'excerpt': item.excerpt,
+        'title': s.title,
+        'titlepath': item.titlepath,
+        'keywords': item.keywords,
+        'docname': s.docname,
+        'file': s.file,
+        'deps': s.deps,
+        'line_start': s.lineno[0],
+        'line_end': s.lineno[1],
+        'url': url,
+        'text': s.text,
+        'src': s.source,
+    }
+
+
+#: Attributes that can be selected by options of get subcommand.
+_GET_ATTRS = [
+    'text',
+    'src',
+    'title',
+    'docname',
+    'file',
+    'deps',
+    'url',
+    'line_start',
+    'line_end',
+]
 
 
 def _on_command_get(args: argparse.Namespace):
+    if args.all:
+        for attr in _GET_ATTRS:
+            setattr(args, attr, True)
+    selected = [attr for attr in _GET_ATTRS if getattr(args, attr)]
+
+    if args.json:
+        _get_json(args, selected)
+        return
+
     # Wrapper for warning when nothing is printed
     printed = False
 
@@ -272,52 +625,182 @@ def _on_command_get(args: argparse.Namespace):
         printed = True
         print(*args, **opts)
 
+    idxfile = _open_indexfile(args)
     for index_id in args.index_id:
-        item = args.cache.get_by_index_id(index_id)
-        if not item:
+        found = _get_item(args, idxfile, index_id)
+        if not found:
             p('no such index ID', file=sys.stderr)
             sys.exit(1)
+        item, doc_id = found
+        attrs = _get_attrs(args, index_id, *found)
         if args.text:
-            p('\n'.join(item.snippet.text))
+            p('\n'.join(attrs['text']))
         if args.src:
-            p('\n'.join(item.snippet.source))
+            p('\n'.join(attrs['src']))
+        if args.title:
+            p(attrs['title'] or '')
         if args.docname:
-            p(item.snippet.docname)
+            p(attrs['docname'])
         if args.file:
-            p(item.snippet.file)
-        if args.deps:
-            if not isinstance(item.snippet, Document):
+            p(attrs['file'])
+        if args.deps and (item.snippet.kind == 'document' or not args.all):
+            if item.snippet.kind != 'document':
                 print(
-                    f'{type(item.snippet)} ({index_id}) is not a document',
+                    f'{item.snippet.kind} ({index_id}) is not a document',
                     file=sys.stderr,
                 )
                 sys.exit(1)
-            if len(item.snippet.deps) == 0:
+            if len(attrs['deps']) == 0:
                 p('')  # prevent print nothing warning
-            for dep in item.snippet.deps:
+            for dep in attrs['deps']:
                 p(dep)
-        if args.url:
-            # HACK: get doc id in better way
-            doc_id, _ = args.cache.index_id_to_doc_id.get(index_id)
-            base_url = args.cfg.base_urls.get(doc_id[0])
-            if not base_url:
+        if args.url and (attrs['url'] or not args.all):
+            if not attrs['url']:
                 print(
                     f'base URL for project {doc_id[0]} not configurated',
                     file=sys.stderr,
                 )
                 sys.exit(1)
-            url = posixpath.join(base_url, doc_id[1] + '.html')
-            if item.snippet.refid:
-                url += '#' + item.snippet.refid
-            p(url)
+            p(attrs['url'])
         if args.line_start:
-            p(item.snippet.lineno[0])
+            p(attrs['line_start'])
         if args.line_end:
-            p(item.snippet.lineno[1])
+            p(attrs['line_end'])
 
         if not printed:
             print('please specify at least one argument', file=sys.stderr)
             sys.exit(1)
+    _record_selection(args, args.index_id)
+
+
+def _get_json(args: argparse.Namespace, selected: list[str]):
+    """
+    Print attributes of pickers as newline delimited JSON, one object per
+    index ID. All attributes are printed if none is selected or ``--all`` is
+    given.
+    """
+    idxfile = _open_indexfile(args)
+    failed = False
+    selection = []
+    for index_id in args.index_id:
+        if not (found := _get_item(args, idxfile, index_id)):
+            obj = {'id': index_id, 'error': 'no such index ID'}
+            failed = True
+        else:
+            selection.append(index_id)
+            obj = _get_attrs(args, index_id, *found)
+            if selected and not args.all:
+                obj = {k: v for k, v in obj.items() if k == 'id' or k in selected}
+        print(json.dumps(obj, ensure_ascii=False), flush=True)
+    _record_selection(args, selection)
+    if failed:
+        sys.exit(1)
+
+
+def _record_selection(args: argparse.Namespace, index_ids: list[IndexID]):
+    """Remember the selected pickers, see ``list --sort frecency``."""
+    if not args.record or not index_ids:
+        return
+    store = Frecency(args.cfg.cache_dir)
+    order = store.ranked()
+    store.record(index_ids)
+    try:
+        store.dump()
+    except OSError:
+        return  # Cache directory is not writable
+    if store.ranked() != order:
+        # Rendered outputs of the old order are outdated
+        rmtree(_frecency_renderdir(args), ignore_errors=True)
+
+
+#: Subcommands that can be handled by picker server.
+_SERVED_COMMANDS = {
+    'list': _on_command_list,
+    'search': _on_command_search,
+    'get': _on_command_get,
+}
+#: Attributes of args that are kept among requests by picker server.
+_SERVER_STATES = ['cache', 'cache_loaded', 'idxfile', 'idxfile_stamp']
+
+
+def _request_server(args: argparse.Namespace) -> dict | None:
+    """Send subcommand to picker server, return None if it is not running."""
+    # NOTE: Importing is slow, do it on demand.
+    from . import server
+
+    sockpath = server.socket_path(args.cfg.cache_dir)
+    if not path.exists(sockpath):
+        return None
+    req_args = {
+        k: v
+        for k, v in vars(args).items()
+        if k not in ('func', 'cfg', 'config', 'version', 'direct', 'command')
+    }
+    req = {
+        'command': args.command,
+        'args': req_args,
+        # Server is started with its own config, see _on_command_serve()
+        'config': path.abspath(args.config),
+    }
+    try:
+        resp = server.request(sockpath, req)
+    except (OSError, ValueError):
+        return None
+    return None if resp.get('rejected') else resp
+
+
+def _on_command_serve(args: argparse.Namespace):
+    # NOTE: Importing is slow, do it on demand.
+    from . import server
+    import io
+    import signal
+    from contextlib import redirect_stdout, redirect_stderr
+
+    config = path.abspath(args.config)
+
+    def handle(req: server.Request) -> server.Response:
+        if req['command'] != 'ping' and req.get('config') != config:
+            return {'rejected': True}
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = 0
+        if req['command'] != 'ping':
+            req_args = argparse.Namespace(**vars(args))
+            vars(req_args).update(req['args'])
+            try:
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    _SERVED_COMMANDS[req['command']](req_args)
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else int(e.code is not None)
+            for k in _SERVER_STATES:
+                setattr(args, k, getattr(req_args, k))
+        return {
+            'status': status,
+            'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue(),
+        }
+
+    sockpath = server.socket_path(args.cfg.cache_dir)
+    try:
+        sock = server.listen(sockpath)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f'listening on {sockpath}', flush=True)
+
+    # Exit normally on SIGTERM, so that the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with suppress(KeyboardInterrupt):
+        server.serve(sock, handle)
+
+
+def _on_command_export_previews(args: argparse.Namespace):
+    try:
+        args.cache.update_previews()
+    except (FileNotFoundError, ValueError) as e:
+        # Cache is not built yet or in unsupported version, the directory is
+        # still printed so that integrations work once the cache is dumped
+        print(f'no preview is exported: {e}', file=sys.stderr)
+    print(args.cache.previewdir())
 
 
 def _on_command_integration(args: argparse.Namespace):
@@ -21,6 +21,19 @@ from xdg.BaseDirectory import xdg_cache_home as __xdg_cache_home
 """
 cache_dir = __path.join(__xdg_cache_home, 'sphinxnotes', 'picker')
 
+"""
+``cache_backend``
+    (Type: ``str``)
+    (Default: ``"pickle"``)
+    Storage backend of snippet cache, available values:
+
+    ``"pickle"``
+        Store every document as a single pickle file under ``cache_dir``.
+    ``"sqlite"``
+        Store all documents in a single SQLite database under ``cache_dir``.
+"""
+cache_backend = 'pickle'
+
 """
 ``base_urls``
     (Type: ``Dict[str,str]``)
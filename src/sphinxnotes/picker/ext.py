@@ -11,8 +11,12 @@ Sphinx extension implementation, but the entrypoint is located at __init__.py.
 from __future__ import annotations
 from typing import TYPE_CHECKING
 import re
+import os
+import dataclasses
 from os import path
-import time
+import json
+from hashlib import sha1
+from multiprocessing.util import Finalize
 
 from docutils import nodes
 from sphinx.locale import __
@@ -23,20 +27,37 @@ if TYPE_CHECKING:
     from sphinx.application import Sphinx
     from sphinx.environment import BuildEnvironment
     from sphinx.config import Config as SphinxConfig
-    from collections.abc import Iterator
+    from collections.abc import Iterator, Iterable
 
 from .config import Config
 from .snippets import Snippet, WithTitle, Document, Section, Code
 from .picker import pick
-from .cache import Cache, Item
-from .keyword import Extractor
+from .cache import Cache, Item, Record, DocID
+from .keyword import KeywordCache, extract_many
+from .manifest import Manifest
 from .utils import titlepath
+from .utils.stats import stats
 
 
 logger = logging.getLogger(__name__)
 
 cache: Cache | None = None
-extractor: Extractor = Extractor()
+#: PID of the main Sphinx process, where the global cache is dumped.
+main_pid: int | None = None
+keyword_cache: KeywordCache | None = None
+#: Manifest of picked documents of the project, see :mod:`.manifest`.
+manifest: Manifest | None = None
+#: Documents picked in this build, keywords of their items are extracted in
+#: batch before dumping, see :func:`_fill_keywords`.
+pending_docs: dict[DocID, list[Item]] = {}
+#: Documents picked in a forked worker process, they are committed in batch
+#: when the worker exits, see :func:`_add_worker_doc`.
+worker_docs: dict[DocID, list[Item]] = {}
+#: PID of the worker process that :data:`worker_docs` belongs to.
+worker_pid: int | None = None
+#: Memoized title paths of document directories in this build, see
+#: :func:`titlepath.resolve_document_text`.
+doctitles_memo: dict[str, list[str]] = {}
 
 
 def extract_tags(s: Snippet) -> str:
@@ -60,15 +81,87 @@ def extract_excerpt(s: Snippet) -> str:
     return ''
 
 
-def extract_keywords(s: Snippet) -> list[str]:
+def extract_record(s: Snippet) -> Record:
+    """Return the plain data of snippet to be persisted."""
+    kind = ''
+    if isinstance(s, Document):
+        kind = 'document'
+    elif isinstance(s, Section):
+        kind = 'section'
+    elif isinstance(s, Code):
+        kind = 'code'
+    return Record(
+        kind=kind,
+        docname=s.docname,
+        file=s.file,
+        lineno=s.lineno,
+        source=s.source,
+        text=s.text,
+        refid=s.refid,
+        title=s.title if isinstance(s, WithTitle) else None,
+        lang=s.lang if isinstance(s, Code) else None,
+        desc=s.desc if isinstance(s, Code) else None,
+        deps=sorted(s.deps) if isinstance(s, Document) else [],
+    )
+
+
+def extract_keyword_sources(s: Record) -> list[str]:
+    """Return the texts that keywords are extracted from."""
+    texts = []
+    if s.title is not None:
+        texts.append(s.title)
+    if s.desc is not None:
+        texts.append(s.desc)
+    return texts
+
+
+def extract_keywords(s: Record, extracted: dict[str, list[str]]) -> list[str]:
+    """Return keywords of snippet, *extracted* is a text -> keywords mapping."""
     keywords = [s.docname]
-    if isinstance(s, WithTitle) and s.title is not None:
-        keywords.extend(extractor.extract(s.title))
-    if isinstance(s, Code):
-        keywords.extend(extractor.extract(s.desc))
+    for text in extract_keyword_sources(s):
+        keywords.extend(extracted[text])
     return keywords
 
 
+def _fill_keywords(docs: Iterable[list[Item]], workers: int) -> None:
+    """
+    Extract keywords for all items of documents in batch, and fill them in
+    place. Unchanged text never hits the NLP stack.
+    """
+    assert keyword_cache is not None
+    docs = list(docs)
+
+    extracted = {}
+    missing = {}  # Used as ordered set
+    for doc in docs:
+        for item in doc:
+            for text in extract_keyword_sources(item.snippet):
+                if text in extracted or text in missing:
+                    continue
+                if (keywords := keyword_cache.get(text)) is None:
+                    missing[text] = None
+                else:
+                    extracted[text] = keywords
+
+    if missing:
+        logger.info(
+            '[picker] extracting keywords from %d text(s) with %d worker(s)',
+            len(missing),
+            workers,
+        )
+    stats.count('texts_extracted', len(missing))
+    for text, keywords in zip(
+        missing, extract_many(list(missing), workers), strict=True
+    ):
+        keyword_cache.put(text, keywords)
+        extracted[text] = keywords
+
+    for doc in docs:
+        for i, item in enumerate(doc):
+            keywords = extract_keywords(item.snippet, extracted)
+            doc[i] = dataclasses.replace(item, keywords=keywords)
+
+
 def _get_document_allowed_tags(pats: dict[str, list[str]], docname: str) -> str:
     """Return the tags of snippets that are allowed to be picked from the document."""
     allowed_tags = ''
@@ -79,15 +172,58 @@ def _get_document_allowed_tags(pats: dict[str, list[str]], docname: str) -> str:
     return allowed_tags
 
 
+def _load_cache(cfg: Config) -> Cache:
+    cache = Cache(cfg.cache_dir, cfg.cache_backend)
+    try:
+        cache.load()
+    except Exception as e:
+        logger.warning('[picker] failed to laod cache: %s' % e)
+    return cache
+
+
+def _update_cache(cache: Cache, key: DocID, doc: list[Item]) -> None:
+    if len(doc) != 0:
+        cache[key] = doc
+    elif key in cache:
+        del cache[key]
+
+
+def _project_file(cfg: Config, project: str, name: str, ext: str) -> str:
+    # Every project has its own file, so that concurrent builds of different
+    # projects never overwrite each other's file.
+    digest = sha1(project.encode()).hexdigest()[:7]
+    return path.join(cfg.cache_dir, f'{name}.{digest}{ext}')
+
+
+def _manifest_file(cfg: Config, project: str) -> str:
+    return _project_file(cfg, project, 'manifest', '.pickle')
+
+
+def _report_file(cfg: Config, project: str) -> str:
+    return _project_file(cfg, project, 'report', '.json')
+
+
 def on_config_inited(app: Sphinx, appcfg: SphinxConfig) -> None:
-    global cache
+    global cache, main_pid, keyword_cache, manifest
+    stats.reset()
     cfg = Config(appcfg.picker_config)
-    cache = Cache(cfg.cache_dir)
+    cache = _load_cache(cfg)
+    main_pid = os.getpid()
 
+    manifest = Manifest(_manifest_file(cfg, appcfg.project))
     try:
-        cache.load()
+        manifest.load()
     except Exception as e:
-        logger.warning('[picker] failed to laod cache: %s' % e)
+        logger.debug('[picker] failed to load manifest: %s' % e)
+
+    keyword_cache = KeywordCache(
+        path.join(cfg.cache_dir, 'keywords.pickle'),
+        appcfg.picker_keyword_cache_size,
+    )
+    try:
+        keyword_cache.load()
+    except Exception as e:
+        logger.debug('[picker] failed to load keyword cache: %s' % e)
 
 
 def on_env_get_outdated(
@@ -98,12 +234,41 @@ def on_env_get_outdated(
     removed: set[str],
 ) -> list[str]:
     # Remove purged indexes and snippetes from db
-    assert cache is not None
+    assert cache is not None and manifest is not None
     for docname in removed:
         del cache[(app.config.project, docname)]
+        manifest.remove(docname)
+    stats.count('docs_purged', len(removed))
     return []
 
 
+def _fingerprint(doc: list[Item]) -> str:
+    """
+    Return hash of items picked from document. Keywords are excluded, they
+    are filled later and derived from the rest.
+    """
+    hasher = sha1()
+    for item in doc:
+        obj = dataclasses.asdict(item)
+        del obj['keywords']
+        hasher.update(json.dumps(obj, ensure_ascii=False).encode())
+    return hasher.hexdigest()
+
+
+def _record_manifest(
+    app: Sphinx, docname: str, picked: bool, fingerprint: str | None
+) -> None:
+    """Record state of document in manifest when it is picked."""
+    if os.getpid() != main_pid:
+        # Manifest is dumped by the main process, documents picked in worker
+        # are left outdated and will be picked again in the next build.
+        return
+    assert cache is not None and manifest is not None
+    deps = [path.join(app.env.srcdir, dep) for dep in app.env.dependencies[docname]]
+    itemname = cache.itemname((app.config.project, docname)) if picked else None
+    manifest.record(docname, app.env.doc2path(docname), deps, itemname, fingerprint)
+
+
 def on_doctree_resolved(app: Sphinx, doctree: nodes.document, docname: str) -> None:
     if not isinstance(doctree, nodes.document):
         # XXX: It may caused by ablog
@@ -115,35 +280,58 @@ def on_doctree_resolved(app: Sphinx, doctree: nodes.document, docname: str) -> N
     allowed_tags = _get_document_allowed_tags(app.config.picker_patterns, docname)
     if not allowed_tags:
         logger.debug('[picker] skip picking: no tag allowed for document %s', docname)
+        _record_manifest(app, docname, False, None)
+        stats.count('docs_skipped')
         return
 
     doc = []
-    snippets = pick(app, doctree, docname)
+    with stats.timer('titlepath'):
+        doctitles = titlepath.resolve_document_text(app.env, docname, doctitles_memo)
+    with stats.timer('pick'):
+        snippets = pick(app, doctree, docname, doctitles)
     tags = []
-    for s, n in snippets:
+    for s, _, tpath in snippets:
         # FIXME: Better filter logic.
         tags.append(extract_tags(s))
         if tags[-1] not in allowed_tags:
             continue
-        tpath = [x.astext() for x in titlepath.resolve(app.env, docname, n)]
-        if isinstance(s, Section):
-            tpath = tpath[1:]
         doc.append(
             Item(
-                snippet=s,
+                snippet=extract_record(s),
                 tags=extract_tags(s),
                 excerpt=extract_excerpt(s),
-                keywords=extract_keywords(s),
+                keywords=[],  # Filled by _fill_keywords()
                 titlepath=tpath,
             )
         )
 
     cache_key = (app.config.project, docname)
-    assert cache is not None
-    if len(doc) != 0:
-        cache[cache_key] = doc
-    elif cache_key in cache:
-        del cache[cache_key]
+    assert cache is not None and manifest is not None
+    fingerprint = _fingerprint(doc)
+    entry = manifest.entries.get(docname)
+    if (
+        entry
+        and entry.fingerprint == fingerprint
+        and (len(doc) == 0 or cache_key in cache)
+    ):
+        # Document is re-resolved (for example, its file is touched) but
+        # picked snippets are unchanged, keep the items in cache untouched.
+        logger.debug('[picker] snippets of document %s are unchanged', docname)
+        stats.count('docs_unchanged')
+    elif os.getpid() == main_pid:
+        _update_cache(cache, cache_key, doc)
+        if len(doc) != 0:
+            pending_docs[cache_key] = doc
+        else:
+            pending_docs.pop(cache_key, None)
+    else:
+        # Builtin builders emit doctree-resolved in the main process even when
+        # writing in parallel, but it is not guaranteed for other builders.
+        _add_worker_doc(app, cache_key, doc)
+    _record_manifest(app, docname, len(doc) != 0, fingerprint)
+    stats.count('docs_picked')
+    stats.count('snippets_picked', len(doc))
+    stats.count('snippets_skipped', len(snippets) - len(doc))
 
     logger.debug(
         '[picker] picked %s/%s pickers in %s, tags: %s, allowed tags: %s',
@@ -155,9 +343,87 @@ def on_doctree_resolved(app: Sphinx, doctree: nodes.document, docname: str) -> N
     )
 
 
+def _add_worker_doc(app: Sphinx, key: DocID, doc: list[Item]) -> None:
+    """
+    Remember document picked in a forked worker process. Changes made to the
+    global cache in the worker are discarded when it exits, so all documents
+    picked by the worker are committed once at its exit.
+    """
+    global worker_pid
+    if worker_pid != os.getpid():
+        # First document of this worker, documents of the parent process are
+        # inherited when forking, forget them.
+        worker_pid = os.getpid()
+        worker_docs.clear()
+        # Finalizers with exit priority are called when a process started by
+        # multiprocessing exits, which is how Sphinx runs parallel tasks.
+        Finalize(
+            None,
+            _commit_worker_docs,
+            args=(Config(app.config.picker_config),),
+            exitpriority=0,
+        )
+    worker_docs[key] = doc
+
+
+def _commit_worker_docs(cfg: Config) -> None:
+    """Commit documents picked in worker process, see :func:`_add_worker_doc`."""
+    _fill_keywords(worker_docs.values(), 1)
+    worker_cache = _load_cache(cfg)
+    for key, doc in worker_docs.items():
+        _update_cache(worker_cache, key, doc)
+    # PDict.dump() merges our changes with changes made by other processes.
+    worker_cache.dump()
+    worker_docs.clear()
+
+
 def on_builder_finished(app: Sphinx, exception) -> None:
+    # Use as many workers as Sphinx's parallel jobs (-j N)
+    with stats.timer('keywords'):
+        _fill_keywords(pending_docs.values(), app.parallel)
+    pending_docs.clear()
+    doctitles_memo.clear()
+
     assert cache is not None
     cache.dump()
+    if app.config.picker_export_previews:
+        with stats.timer('previews'):
+            cache.update_previews()
+
+    assert manifest is not None
+    if manifest.dirty:
+        manifest.dump()
+
+    assert keyword_cache is not None
+    logger.info(
+        '[picker] keyword cache: %d hit(s), %d miss(es), %d entries',
+        keyword_cache.hits,
+        keyword_cache.misses,
+        len(keyword_cache),
+    )
+    if keyword_cache.misses:
+        keyword_cache.dump()
+
+    _report_stats(app)
+
+
+def _report_stats(app: Sphinx) -> None:
+    """Print stats of this build, and write them to cache_dir if required."""
+    for line in stats.summary():
+        logger.info('[picker] %s', line)
+    if not app.config.picker_build_report:
+        return
+    cfg = Config(app.config.picker_config)
+    report = {'project': app.config.project, **stats.snapshot()}
+    fn = _report_file(cfg, app.config.project)
+    # Write to a temporary file then rename it, so that readers never see a
+    # partially written report.
+    os.makedirs(path.dirname(fn), exist_ok=True)
+    tmpfile = f'{fn}.{os.getpid()}.tmp'
+    with open(tmpfile, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmpfile, fn)
+    logger.info('[picker] build report is written to %s', fn)
 
 
 class SnippetBuilder(DummyBuilder):  # DummyBuilder has dummy impls we need.
@@ -167,38 +433,30 @@ class SnippetBuilder(DummyBuilder):  # DummyBuilder has dummy impls we need.
     )
 
     def get_outdated_docs(self) -> Iterator[str]:
-        """Modified from :py:meth:`sphinx.builders.html.StandaloneHTMLBuilder.get_outdated_docs`."""
+        """
+        Modified from :py:meth:`sphinx.builders.html.StandaloneHTMLBuilder.get_outdated_docs`.
+
+        Documents are compared with the manifest recorded when they are
+        picked, so changes of their dependent files are detected too.
+        """
+        assert cache is not None and manifest is not None
+        project = self.app.config.project
         for docname in self.env.found_docs:
             if docname not in self.env.all_docs:
                 logger.debug('[build target] did not in env: %r', docname)
                 yield docname
                 continue
 
-            assert cache is not None
-            targetname = cache.itemfile((self.app.config.project, docname))
-            try:
-                targetmtime = path.getmtime(targetname)
-            except Exception:
-                targetmtime = 0
-            try:
-                srcmtime = path.getmtime(self.env.doc2path(docname))
-                if srcmtime > targetmtime:
-                    logger.debug(
-                        '[build target] targetname %r(%s), docname %r(%s)',
-                        targetname,
-                        _format_modified_time(targetmtime),
-                        docname,
-                        _format_modified_time(
-                            path.getmtime(self.env.doc2path(docname))
-                        ),
-                    )
-                    yield docname
-            except OSError:
-                # source doesn't exist anymore
-                pass
-
-
-def _format_modified_time(timestamp: float) -> str:
-    """Return an RFC 3339 formatted string representing the given timestamp."""
-    seconds, fraction = divmod(timestamp, 1)
-    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds)) + f'.{fraction:.3f}'
+            if manifest.is_outdated(docname):
+                logger.debug('[build target] changed since picked: %r', docname)
+                yield docname
+                continue
+
+            # Items may be lost with an incompatible cache which failed to
+            # load, do not trust the manifest.
+            itemname = manifest.entries[docname].itemname
+            if itemname is not None and (project, docname) not in cache:
+                logger.debug(
+                    '[build target] item %r not in cache: %r', itemname, docname
+                )
+                yield docname
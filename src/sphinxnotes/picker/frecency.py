@@ -0,0 +1,85 @@
+"""
+sphinxnotes.picker.frecency
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+A small store that remembers how frequently and how recently every picker
+is selected, so that the likely candidates can be listed first.
+
+Every selection adds 1 to the score of picker, and the score halves every
+:data:`HALF_LIFE` seconds.
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+# **NOTE**: This module is used by CLI, import new packages with caution.
+from __future__ import annotations
+from typing import Iterable
+import os
+from os import path
+import json
+import time
+
+#: Name of store file under cache directory.
+FILENAME = 'frecency.json'
+#: Seconds in which the score halves.
+HALF_LIFE = 14 * 24 * 3600
+#: Selections of the same picker within the seconds count as one, integrations
+#: may query several attributes of one selection.
+DEDUP_INTERVAL = 10
+#: Maximum number of pickers to remember, the lowest scored ones are dropped.
+MAX_ENTRIES = 1000
+
+
+class Frecency(object):
+    """Index ID -> (score, time of last selection) store."""
+
+    filename: str
+    entries: dict[str, tuple[float, float]]
+
+    def __init__(self, dirname: str) -> None:
+        self.filename = path.join(dirname, FILENAME)
+        try:
+            with open(self.filename, 'r') as f:
+                self.entries = {k: tuple(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            # Store is missing or broken, start over
+            self.entries = {}
+
+    def score(self, key: str, now: float | None = None) -> float:
+        """Return the current score of picker, 0 if it is never selected."""
+        if key not in self.entries:
+            return 0
+        score, last = self.entries[key]
+        now = time.time() if now is None else now
+        return score * 0.5 ** (max(now - last, 0) / HALF_LIFE)
+
+    def record(self, keys: Iterable[str], now: float | None = None) -> None:
+        """Record selections of pickers."""
+        now = time.time() if now is None else now
+        for key in keys:
+            if key in self.entries and now - self.entries[key][1] < DEDUP_INTERVAL:
+                self.entries[key] = (self.entries[key][0], now)
+            else:
+                self.entries[key] = (self.score(key, now) + 1, now)
+
+    def ranked(self, now: float | None = None) -> list[str]:
+        """
+        Return selected pickers, ordered by score in descending order.
+
+        Scores of all pickers decay at the same rate, so the order only
+        changes when selections are recorded.
+        """
+        now = time.time() if now is None else now
+        return sorted(self.entries, key=lambda k: self.score(k, now), reverse=True)
+
+    def dump(self) -> None:
+        keys = self.ranked()[:MAX_ENTRIES]
+        data = json.dumps({k: self.entries[k] for k in keys})
+        # Write to a temporary file then rename it, so that readers never see
+        # a partially written store.
+        os.makedirs(path.dirname(self.filename), exist_ok=True)
+        tmpfile = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmpfile, 'w') as f:
+            f.write(data)
+        os.replace(tmpfile, self.filename)
@@ -0,0 +1,356 @@
+"""
+sphinxnotes.picker.fuzzy
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+In-process fuzzy matcher for interactive queries.
+
+Searchable text of all rows are packed into a single newline separated
+string (see :func:`pack`), so a query is matched against all rows by
+regular expression in C. Rows that contain the query consecutively rank
+first and are taken in order until the limit is reached, only when there
+are not enough of them, the rest matched rows are scored in Python and the
+top k of them are selected via heap.
+
+Rows that lack any character of query are ruled out by character bitmaps
+(see :func:`charmaps`) before matching, so the regular expression only
+runs on candidate rows. Once the top k is filled, rows whose match is too
+wide to enter it are skipped without scoring. Candidate rows are still
+matched one by one, so queries whose characters are common in all rows are
+the slowest ones.
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+# **NOTE**: This module is used by CLI, import new packages with caution.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Protocol, Sequence
+import heapq
+import math
+import re
+
+if TYPE_CHECKING:
+    from .cache import Index
+    from .indexfile import Row
+
+#: Separator of rows in packed haystack, it never appears in a row.
+ROW_SEPARATOR = '\n'
+
+# Score of every matched character, and the bonus when the match starts at
+# the beginning of word, or all characters are matched consecutively.
+SCORE_MATCH = 16
+BONUS_BOUNDARY = 8
+BONUS_CONSECUTIVE = 32
+
+_BOUNDARY_CHARS = frozenset(' /_-.:`<[(' + ROW_SEPARATOR)
+
+#: Maximum number of alternatives of pattern compiled by
+#: :func:`_compile_narrow_query`.
+_MAX_ALTERNATIVES = 64
+
+#: Characters that have their own bucket in character bitmaps, the others
+#: share the rest buckets by code point.
+_BUCKETED_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+#: Number of buckets of character bitmaps.
+NUM_BUCKETS = 64
+
+
+def haystack(index: Index) -> str:
+    """
+    Return the searchable text of index: words of excerpt, titlepath and
+    keywords. Keywords mostly come from title, so duplicated words are
+    removed to keep haystack small.
+    """
+    text = ' '.join([index[1], *index[2], *index[3]])
+    return ' '.join(dict.fromkeys(text.lower().split()))
+
+
+def pack(indexes: Iterable[Index]) -> str:
+    """Pack haystacks of indexes into a single string, one row per line."""
+    return ROW_SEPARATOR.join(haystack(index) for index in indexes)
+
+
+def bucket(c: str) -> int:
+    """Return the bucket of character in character bitmaps."""
+    if (i := _BUCKETED_CHARS.find(c)) >= 0:
+        return i
+    n = NUM_BUCKETS - len(_BUCKETED_CHARS)
+    return len(_BUCKETED_CHARS) + ord(c) % n
+
+
+def charmaps(haystacks: Iterable[str]) -> list[bytes]:
+    """
+    Return character bitmaps of haystacks: for every bucket, a little-endian
+    bitmap of rows, whose n-th bit is set when the n-th row contains any
+    character of the bucket.
+    """
+    rows: list[set[int]] = [{bucket(c) for c in set(h)} for h in haystacks]
+    size = (len(rows) + 7) // 8
+    bitmaps = [bytearray(size) for _ in range(NUM_BUCKETS)]
+    for n, buckets in enumerate(rows):
+        byte, bit = n >> 3, 1 << (n & 7)
+        for b in buckets:
+            bitmaps[b][byte] |= bit
+    return [bytes(bitmap) for bitmap in bitmaps]
+
+
+def offsets(haystacks: Iterable[str]) -> list[int]:
+    """
+    Return positions of rows in packed haystacks, and the position after the
+    end of last row, plus the length of separator.
+    """
+    result = [0]
+    for h in haystacks:
+        result.append(result[-1] + len(h) + len(ROW_SEPARATOR))
+    return result
+
+
+class Corpus(Protocol):
+    """Rows to be matched against, rows are referred by their numbers."""
+
+    def haystacks(self) -> str:
+        """Return the packed haystacks of all rows, see :func:`pack`."""
+        ...
+
+    def row(self, n: int) -> Row:
+        """Return the n-th row."""
+        ...
+
+    def charmap(self, bucket: int) -> int:
+        """Return bitmap of the bucket, see :func:`charmaps`."""
+        ...
+
+    def offsets(self) -> Sequence[int]:
+        """Return positions of rows in packed haystacks, see :func:`offsets`."""
+        ...
+
+
+class MemoryCorpus(object):
+    """A :class:`Corpus` built in memory, used when no index file."""
+
+    def __init__(self, rows: Iterable[Row]) -> None:
+        self._rows = list(rows)
+        haystacks = [haystack(index) for _, index, _ in self._rows]
+        self._haystacks = ROW_SEPARATOR.join(haystacks)
+        self._charmaps = charmaps(haystacks)
+        self._offsets = offsets(haystacks)
+
+    def haystacks(self) -> str:
+        return self._haystacks
+
+    def charmap(self, bucket: int) -> int:
+        return int.from_bytes(self._charmaps[bucket], 'little')
+
+    def offsets(self) -> Sequence[int]:
+        return self._offsets
+
+    def row(self, n: int) -> Row:
+        return self._rows[n]
+
+
+def compile_query(query: str) -> re.Pattern[str]:
+    """
+    Compile query to a pattern that matches rows containing all characters
+    of query in order.
+    """
+    # "abc" -> "a[^\nb]*b[^\nc]*c", every character can only be matched in one
+    # way, which prevents catastrophic backtracking of lazy "a.*?b.*?c".
+    return re.compile(_join_query(query, ['*'] * (len(query) - 1)))
+
+
+def _compile_narrow_query(query: str, gap: int) -> re.Pattern[str]:
+    """
+    Like :func:`compile_query`, but only match rows where no more than *gap*
+    characters are skipped in total. When there are too many ways to skip,
+    rows that skip no more than *gap* characters every time are matched.
+    """
+    k = len(query) - 1
+    if math.comb(gap + k, k) > _MAX_ALTERNATIVES:
+        return re.compile(_join_query(query, [f'{{0,{gap}}}'] * k))
+    alternatives = [
+        _join_query(query, [f'{{{n}}}' for n in gaps]) for gaps in _distribute(gap, k)
+    ]
+    return re.compile('|'.join(alternatives))
+
+
+def _join_query(query: str, quantifiers: list[str]) -> str:
+    pattern = re.escape(query[0])
+    for c, quantifier in zip(query[1:], quantifiers, strict=True):
+        pattern += f'[^{re.escape(ROW_SEPARATOR + c)}]{quantifier}{re.escape(c)}'
+    return pattern
+
+
+def _distribute(total: int, k: int) -> Iterator[tuple[int, ...]]:
+    """Yield all tuples of *k* non-negative integers that sum to at most *total*."""
+    if k == 0:
+        yield ()
+        return
+    for n in range(total + 1):
+        for rest in _distribute(total - n, k - 1):
+            yield (n, *rest)
+
+
+def score(text: str, query: str, end: int) -> int:
+    """
+    Score the match of query that ends at position *end* of text.
+
+    The match is shrunk to the shortest one ends at *end* by scanning
+    backwards, shorter match gets higher score.
+    """
+    start = end
+    for c in reversed(query):
+        start = text.rfind(c, 0, start)
+    width = end - start
+    s = SCORE_MATCH * len(query) - (width - len(query))
+    if width == len(query):
+        s += BONUS_CONSECUTIVE
+    if start == 0 or text[start - 1] in _BOUNDARY_CHARS:
+        s += BONUS_BOUNDARY
+    return s
+
+
+def _iter_rows(
+    haystacks: str, pattern: re.Pattern[str]
+) -> Iterator[tuple[int, re.Match[str]]]:
+    """Yield row number and the first match in row of all matched rows."""
+    n = 0  # Row number of current match
+    pos = 0  # Position that rows are counted to
+    while m := pattern.search(haystacks, pos):
+        n += haystacks.count(ROW_SEPARATOR, pos, m.start())
+        yield n, m
+        # Skip the rest of row
+        pos = haystacks.find(ROW_SEPARATOR, m.end())
+        if pos < 0:
+            break
+
+
+def _candidates(corpus: Corpus, query: str) -> int:
+    """Return bitmap of rows that may contain all characters of query."""
+    result = -1
+    for b in {bucket(c) for c in query}:
+        result &= corpus.charmap(b)
+        if not result:
+            break
+    return result
+
+
+def _match_candidates(
+    haystacks: str,
+    offsets: Sequence[int],
+    candidates: int,
+    query: str,
+    skipped: set[int],
+    limit: int | None,
+) -> list[tuple[int, int]]:
+    """
+    Return (score, negated row number) of candidate rows that match the query,
+    rows in *skipped* are excluded. If *limit* is given, only the top *limit*
+    of them are returned, in descending order.
+    """
+    pattern = compile_query(query)
+    first = query[0]
+    # Only rows that may enter the top are matched by it, see below
+    prefilter, max_gap = None, 0
+    # Min heap of the top rows if limit is given, or all matched rows
+    top: list[tuple[int, int]] = []
+    # Bits of bitmap, from the lowest to the highest
+    bits = bin(candidates)[:1:-1]
+    n = bits.find('1')
+    while n >= 0:
+        end = offsets[n + 1] - 1
+        # If the query can not be matched from the first occurrence of its
+        # first character, it can not be matched from the later ones either,
+        # so match once rather than searching.
+        start = haystacks.find(first, offsets[n], end)
+        if (
+            start >= 0
+            and n not in skipped
+            and (prefilter is None or prefilter.search(haystacks, start, end))
+            and (m := pattern.match(haystacks, start, end))
+        ):
+            entry = (score(haystacks, query, m.end()), -n)
+            if limit is None or len(top) < limit:
+                top.append(entry)
+                if len(top) == limit:
+                    heapq.heapify(top)
+            elif entry > top[0]:
+                heapq.heapreplace(top, entry)
+            if limit is not None and len(top) == limit:
+                # Rows are matched in order, so a row enters the top only when
+                # it scores higher than the lowest one, which requires the
+                # match to skip less than *gap* characters (see score()).
+                gap = SCORE_MATCH * len(query) + BONUS_BOUNDARY - top[0][0] - 1
+                if gap < 0:
+                    break  # No row can enter the top
+                # Compiling pattern is not cheap, recompile it only when it
+                # can be much narrower.
+                if prefilter is None or gap <= max_gap // 2:
+                    prefilter, max_gap = _compile_narrow_query(query, gap), gap
+        n = bits.find('1', n + 1)
+    if limit is not None:
+        top.sort(reverse=True)
+    return top
+
+
+def search(
+    corpus: Corpus,
+    query: str,
+    limit: int,
+    accept: Callable[[Row], bool] | None = None,
+) -> list[tuple[int, Row]]:
+    """
+    Return the top *limit* rows that match the query and are accepted by
+    *accept*, with their scores. White spaces in query are ignored.
+    """
+    query = ''.join(c for c in query.lower() if not c.isspace())
+    if not query or limit <= 0:
+        return []
+    if not (candidates := _candidates(corpus, query)):
+        return []
+    haystacks = corpus.haystacks()
+    results = []
+    seen = set()
+
+    # Rows that contain the query consecutively are scored higher than any
+    # other row, and are scored the same (with or without the boundary bonus).
+    # As ties are broken by row number, the first matched rows are taken and
+    # the rest are never scored.
+    exact = SCORE_MATCH * len(query) + BONUS_CONSECUTIVE
+    at_boundary = []
+    not_at_boundary = []
+    for n, m in _iter_rows(haystacks, re.compile(re.escape(query))):
+        # Look for occurrence at boundary in the rest of row
+        start = m.start()
+        while start > 0 and haystacks[start - 1] not in _BOUNDARY_CHARS:
+            start = haystacks.find(query, start + 1)
+            if start < 0 or ROW_SEPARATOR in haystacks[m.end() : start]:
+                break
+        else:
+            at_boundary.append(n)
+            if len(at_boundary) >= limit and accept is None:
+                break
+            continue
+        not_at_boundary.append(n)
+    for rows, s in [(at_boundary, exact + BONUS_BOUNDARY), (not_at_boundary, exact)]:
+        for n in rows:
+            seen.add(n)
+            row = corpus.row(n)
+            if accept is None or accept(row):
+                results.append((s, row))
+                if len(results) >= limit:
+                    return results
+
+    # Score the rest fuzzy matched rows and select the top k, ties are broken
+    # by row number
+    offsets = corpus.offsets()
+    if accept is None:
+        limit -= len(results)
+        top = _match_candidates(haystacks, offsets, candidates, query, seen, limit)
+        return results + [(s, corpus.row(-n)) for s, n in top]
+    ranked = _match_candidates(haystacks, offsets, candidates, query, seen, None)
+    for s, n in sorted(ranked, reverse=True):
+        if accept(row := corpus.row(-n)):
+            results.append((s, row))
+            if len(results) >= limit:
+                break
+    return results
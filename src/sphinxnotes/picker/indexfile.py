@@ -0,0 +1,471 @@
+"""
+sphinxnotes.picker.indexfile
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+A compact, fixed-layout binary file of snippet indexes, which can be read via
+mmap without deserializing the whole cache.
+
+Layout of file (all integers are little-endian)::
+
+   +-----------+--------------------------------------------------------+
+   | header    | magic, version, number of rows, offsets of sections,   |
+   |           | (offset, length) of statistic JSON in string table,    |
+   |           | number of terms, total number of terms of all rows,    |
+   |           | (offset, length) of packed haystacks for fuzzy match,  |
+   |           | number of facets, offsets of haystack offsets and      |
+   |           | character bitmaps                                      |
+   +-----------+--------------------------------------------------------+
+   | rows      | fixed-size rows, every string field is an              |
+   |           | (offset, length) pair that points to the string table, |
+   |           | number of terms of row is also stored for ranking      |
+   +-----------+--------------------------------------------------------+
+   | directory | row numbers sorted by index ID, for binary search      |
+   +-----------+--------------------------------------------------------+
+   | docname   | row numbers sorted by docname, for prefix range query  |
+   | directory |                                                        |
+   +-----------+--------------------------------------------------------+
+   | facets    | (kind, value) of tags and projects, every entry points |
+   |           | to a run of postings                                   |
+   +-----------+--------------------------------------------------------+
+   | terms     | terms of inverted index sorted by term, every entry    |
+   |           | points to a run of postings                            |
+   +-----------+--------------------------------------------------------+
+   | postings  | (row number, term frequency) pairs, frequency is       |
+   |           | always 1 for postings of facets                        |
+   +-----------+--------------------------------------------------------+
+   | haystack  | positions of rows in packed haystacks, see             |
+   | offsets   | :func:`.fuzzy.offsets`                                 |
+   +-----------+--------------------------------------------------------+
+   | character | bitmaps of rows for every character bucket, for        |
+   | bitmaps   | prefiltering fuzzy match, see :func:`.fuzzy.charmaps`  |
+   +-----------+--------------------------------------------------------+
+   | string    | UTF-8 encoded strings                                  |
+   | table     |                                                        |
+   +-----------+--------------------------------------------------------+
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+# **NOTE**: This module is used by CLI, import new packages with caution.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+from collections import Counter
+import os
+import struct
+import mmap
+import json
+
+from .search import terms
+from .fuzzy import haystack, charmaps, offsets, ROW_SEPARATOR, NUM_BUCKETS
+from .utils.matching import compile_pattern, literal_prefix
+
+if TYPE_CHECKING:
+    from .cache import IndexID, Index, DocID, Location
+
+    Row = tuple[IndexID, Index, DocID]
+
+#: Name of index file under cache directory.
+FILENAME = 'index.bin'
+
+MAGIC = b'SNPI'
+VERSION = 7
+
+#: Separator of list fields (titlepath and keywords).
+SEPARATOR = '\x1f'
+
+# magic, version, number of rows, offset of directory, offset of string table,
+# (offset, length) of statistic, offset of terms, number of terms,
+# offset of postings, total number of terms of all rows, (offset, length) of
+# packed haystacks, offset of docname directory, offset of facets,
+# number of facets, offset of haystack offsets, offset of character bitmaps
+_HEADER = struct.Struct('<4sHxxIQQQIQIQQQIQQIQQ')
+# (offset, length) of: index ID, tags, excerpt, titlepath, keywords,
+# project, docname, item name; then offset, length and checksum of item,
+# number of terms
+_ROW = struct.Struct('<' + 'QI' * 8 + 'QIII')
+_DIRENT = struct.Struct('<I')
+# (offset, length) of term, index of first posting, number of postings
+_TERM = struct.Struct('<QIII')
+# (offset, length) of kind and value, index of first posting, number of postings
+_FACET = struct.Struct('<QIQIII')
+# row number, term frequency
+_POSTING = struct.Struct('<II')
+# position of row in packed haystacks
+_OFFSET = struct.Struct('<I')
+
+
+class IndexFile(object):
+    """A read-only, memory mapped index file."""
+
+    filename: str
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            # NOTE: mmap raises ValueError for empty file.
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._buf) < _HEADER.size:
+            self._buf.close()
+            raise ValueError(f'truncated index file {filename}')
+        magic, version, *sections = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self._buf.close()
+            raise ValueError(
+                f'unsupported index file {filename}: {magic!r}, version {version}'
+            )
+        (
+            self._num_rows,
+            self._dir,
+            self._strtab,
+            stat_offset,
+            stat_length,
+            self._terms,
+            self._num_terms,
+            self._postings,
+            self._total_length,
+            haystacks_offset,
+            haystacks_length,
+            self._docname_dir,
+            self._facets,
+            self._num_facets,
+            self._offsets,
+            self._charmaps,
+        ) = sections
+        self._stat = (stat_offset, stat_length)
+        self._haystacks = (haystacks_offset, haystacks_length)
+        self._haystacks_str: str | None = None
+        self._offsets_tuple: tuple[int, ...] | None = None
+        if not self._is_well_formed():
+            self._buf.close()
+            raise ValueError(f'malformed or truncated index file {filename}')
+
+    def _is_well_formed(self) -> bool:
+        """Return whether sections are laid out as :func:`dump` writes them."""
+        strtab_size = len(self._buf) - self._strtab
+        return (
+            self._dir == _HEADER.size + self._num_rows * _ROW.size
+            and self._docname_dir == self._dir + self._num_rows * _DIRENT.size
+            and self._facets == self._docname_dir + self._num_rows * _DIRENT.size
+            and self._terms == self._facets + self._num_facets * _FACET.size
+            and self._postings == self._terms + self._num_terms * _TERM.size
+            and self._postings <= self._offsets
+            and self._charmaps == self._offsets + (self._num_rows + 1) * _OFFSET.size
+            and self._strtab == self._charmaps + NUM_BUCKETS * self._charmap_size()
+            and self._strtab <= len(self._buf)
+            and sum(self._stat) <= strtab_size
+            and sum(self._haystacks) <= strtab_size
+        )
+
+    def __len__(self) -> int:
+        return self._num_rows
+
+    def __iter__(self) -> Iterator[Row]:
+        start = _HEADER.size
+        stop = start + _ROW.size * self._num_rows
+        for row in _ROW.iter_unpack(memoryview(self._buf)[start:stop]):
+            yield self._decode_row(row)
+
+    def stat(self) -> dict[str, Any]:
+        """Return the statistic information of cache."""
+        return json.loads(self._str(*self._stat))
+
+    def select(
+        self, tags: str = '*', project: str | None = None, docname: str = '**'
+    ) -> Iterator[Row]:
+        """
+        Iterate over rows that have any of given tags, belong to the project,
+        and whose docname matches the glob pattern, in order of rows.
+
+        Only the postings of facets and rows in docname range of the literal
+        prefix of pattern are touched.
+        """
+        selected: set[int] | None = None
+        if '*' not in tags:
+            selected = set()
+            for value, rows in self.facet('tags').items():
+                if value in tags:
+                    selected.update(rows)
+        if project is not None:
+            rows = self.facet('project').get(project, [])
+            selected = set(rows) if selected is None else selected.intersection(rows)
+        if docname != '**':
+            prefix = literal_prefix(docname)
+            pattern = compile_pattern(docname)
+            lo, hi = self._docname_range(prefix)
+            if selected is None or hi - lo < len(selected):
+                candidates = [self._docname_dirent(i) for i in range(lo, hi)]
+                if selected is not None:
+                    candidates = [n for n in candidates if n in selected]
+            else:
+                candidates = [
+                    n for n in selected if self._docname(n).startswith(prefix)
+                ]
+            selected = {n for n in candidates if pattern.match(self._docname(n))}
+
+        if selected is None:
+            yield from self
+            return
+        for n in sorted(selected):
+            yield self.row(n)
+
+    def facet(self, kind: str) -> dict[str, list[int]]:
+        """Return value -> row numbers of the given kind of facet."""
+        result = {}
+        for i in range(self._num_facets):
+            entry = _FACET.unpack_from(self._buf, self._facets + i * _FACET.size)
+            if self._str(entry[0], entry[1]) != kind:
+                continue
+            rows = [n for n, _ in self._read_postings(entry[4], entry[5])]
+            result[self._str(entry[2], entry[3])] = rows
+        return result
+
+    def _docname(self, n: int) -> str:
+        row = self._unpack_row(n)
+        return self._str(row[12], row[13])
+
+    def _docname_dirent(self, i: int) -> int:
+        return _DIRENT.unpack_from(self._buf, self._docname_dir + i * _DIRENT.size)[0]
+
+    def _docname_range(self, prefix: str) -> tuple[int, int]:
+        """Return range in docname directory of docnames start with prefix."""
+
+        def bisect(key: str) -> int:
+            lo, hi = 0, self._num_rows
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._docname(self._docname_dirent(mid)) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+
+        if not prefix:
+            return 0, self._num_rows
+        return bisect(prefix), bisect(prefix + '\U0010ffff')
+
+    def lookup(self, index_id: IndexID) -> tuple[Row, Location] | None:
+        """
+        Find row by index ID via binary search on directory, return the row
+        and location of the serialized item.
+        """
+        lo, hi = 0, self._num_rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (n,) = _DIRENT.unpack_from(self._buf, self._dir + mid * _DIRENT.size)
+            row = self._unpack_row(n)
+            key = self._str(row[0], row[1])
+            if key == index_id:
+                return self._decode_row(row), (self._str(row[14], row[15]), *row[16:19])
+            elif key < index_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def total_length(self) -> int:
+        """Return the total number of terms of all rows."""
+        return self._total_length
+
+    def postings(self, term: str) -> list[tuple[int, int]]:
+        """
+        Return (row number, term frequency) of rows that contain the term,
+        via binary search on terms.
+        """
+        lo, hi = 0, self._num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = _TERM.unpack_from(self._buf, self._terms + mid * _TERM.size)
+            key = self._str(entry[0], entry[1])
+            if key == term:
+                return self._read_postings(entry[2], entry[3])
+            elif key < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return []
+
+    def _read_postings(self, first: int, count: int) -> list[tuple[int, int]]:
+        start = self._postings + first * _POSTING.size
+        stop = start + count * _POSTING.size
+        return list(_POSTING.iter_unpack(self._buf[start:stop]))
+
+    def length(self, n: int) -> int:
+        """Return the number of terms of the n-th row."""
+        return self._unpack_row(n)[19]
+
+    def row(self, n: int) -> Row:
+        """Return the n-th row."""
+        return self._decode_row(self._unpack_row(n))
+
+    def haystacks(self) -> str:
+        """Return the packed haystacks of all rows, see :func:`.fuzzy.pack`."""
+        if self._haystacks_str is None:
+            self._haystacks_str = self._str(*self._haystacks)
+        return self._haystacks_str
+
+    def charmap(self, bucket: int) -> int:
+        """Return bitmap of character bucket, see :func:`.fuzzy.charmaps`."""
+        start = self._charmaps + bucket * self._charmap_size()
+        return int.from_bytes(self._buf[start : start + self._charmap_size()], 'little')
+
+    def _charmap_size(self) -> int:
+        return (self._num_rows + 7) // 8
+
+    def offsets(self) -> tuple[int, ...]:
+        """Return positions of rows in packed haystacks, see :func:`.fuzzy.offsets`."""
+        if self._offsets_tuple is None:
+            fmt = f'<{self._num_rows + 1}I'
+            self._offsets_tuple = struct.unpack_from(fmt, self._buf, self._offsets)
+        return self._offsets_tuple
+
+    def _unpack_row(self, n: int) -> tuple[int, ...]:
+        return _ROW.unpack_from(self._buf, _HEADER.size + n * _ROW.size)
+
+    def _str(self, offset: int, length: int) -> str:
+        offset += self._strtab
+        return self._buf[offset : offset + length].decode()
+
+    def _list(self, offset: int, length: int) -> list[str]:
+        return self._str(offset, length).split(SEPARATOR) if length else []
+
+    def _decode_row(self, row: tuple[int, ...]) -> Row:
+        s, l = self._str, self._list
+        index_id = s(row[0], row[1])
+        index = (
+            s(row[2], row[3]),
+            s(row[4], row[5]),
+            l(row[6], row[7]),
+            l(row[8], row[9]),
+        )
+        doc_id = (s(row[10], row[11]), s(row[12], row[13]))
+        return index_id, index, doc_id
+
+    def close(self) -> None:
+        self._buf.close()
+
+
+def dump(
+    filename: str,
+    indexes: Iterable[tuple[IndexID, Index, DocID, Location]],
+    stat: dict[str, Any],
+) -> None:
+    """
+    Write indexes, locations of items, inverted index of keywords and
+    statistic to file atomically.
+    """
+    rows = bytearray()
+    strtab = bytearray()
+
+    def add(s: str) -> tuple[int, int]:
+        b = s.encode()
+        offset = len(strtab)
+        strtab.extend(b)
+        return offset, len(b)
+
+    ids = []
+    docnames = []
+    facets: dict[tuple[str, str], list[int]] = {}
+    haystacks = []
+    inverted: dict[str, list[tuple[int, int]]] = {}
+    total_length = 0
+    for n, (index_id, index, doc_id, loc) in enumerate(indexes):
+        tfs = Counter(terms(index[3]))
+        for term, tf in tfs.items():
+            inverted.setdefault(term, []).append((n, tf))
+        length = sum(tfs.values())
+        total_length += length
+        haystacks.append(haystack(index))
+        rows.extend(
+            _ROW.pack(
+                *add(index_id),
+                *add(index[0]),
+                *add(index[1]),
+                *add(SEPARATOR.join(index[2])),
+                *add(SEPARATOR.join(index[3])),
+                *add(doc_id[0]),
+                *add(doc_id[1]),
+                *add(loc[0]),
+                loc[1],
+                loc[2],
+                loc[3],
+                length,
+            )
+        )
+        ids.append(index_id)
+        docnames.append(doc_id[1])
+        facets.setdefault(('tags', index[0]), []).append(n)
+        facets.setdefault(('project', doc_id[0]), []).append(n)
+
+    offsettab = bytearray()
+    for offset in offsets(haystacks):
+        offsettab.extend(_OFFSET.pack(offset))
+    charmaptab = b''.join(charmaps(haystacks))
+
+    directory = bytearray()
+    for n in sorted(range(len(ids)), key=ids.__getitem__):
+        directory.extend(_DIRENT.pack(n))
+    docname_dir = bytearray()
+    for n in sorted(range(len(docnames)), key=docnames.__getitem__):
+        docname_dir.extend(_DIRENT.pack(n))
+
+    termtab = bytearray()
+    postings = bytearray()
+    num_postings = 0
+    for term in sorted(inverted):
+        entries = inverted[term]
+        termtab.extend(_TERM.pack(*add(term), num_postings, len(entries)))
+        for entry in entries:
+            postings.extend(_POSTING.pack(*entry))
+        num_postings += len(entries)
+    facettab = bytearray()
+    for (kind, value), entries in facets.items():
+        facettab.extend(
+            _FACET.pack(*add(kind), *add(value), num_postings, len(entries))
+        )
+        for n in entries:
+            postings.extend(_POSTING.pack(n, 1))
+        num_postings += len(entries)
+
+    dir_offset = _HEADER.size + len(rows)
+    docname_dir_offset = dir_offset + len(directory)
+    facets_offset = docname_dir_offset + len(docname_dir)
+    terms_offset = facets_offset + len(facettab)
+    postings_offset = terms_offset + len(termtab)
+    offsets_offset = postings_offset + len(postings)
+    charmaps_offset = offsets_offset + len(offsettab)
+    strtab_offset = charmaps_offset + len(charmaptab)
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        len(ids),
+        dir_offset,
+        strtab_offset,
+        *add(json.dumps(stat)),
+        terms_offset,
+        len(inverted),
+        postings_offset,
+        total_length,
+        *add(ROW_SEPARATOR.join(haystacks)),
+        docname_dir_offset,
+        facets_offset,
+        len(facets),
+        offsets_offset,
+        charmaps_offset,
+    )
+
+    # Write to a temporary file then rename it, so that readers never see
+    # a partially written file.
+    tmpfile = f'{filename}.{os.getpid()}.tmp'
+    with open(tmpfile, 'wb') as f:
+        f.write(header)
+        f.write(rows)
+        f.write(directory)
+        f.write(docname_dir)
+        f.write(facettab)
+        f.write(termtab)
+        f.write(postings)
+        f.write(offsettab)
+        f.write(charmaptab)
+        f.write(strtab)
+    os.replace(tmpfile, filename)
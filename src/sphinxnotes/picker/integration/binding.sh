@@ -3,9 +3,10 @@
 #
 # :Author: Shengyu Zhang
 # :Date: 2021-08-14
-# :Version: 20240828
+# :Version: 20261018
 
 function picker_view() {
+  picker_preview_dir
   selection=$(picker_list)
   [ -z "$selection" ] && return
 
@@ -18,21 +19,23 @@ function picker_view() {
     fi
   fi
 
-  echo "$PICKER get --src $selection | $PAGER"
+  echo "$PICKER get --record --src $selection | $PAGER"
 }
 
 function picker_edit() {
+  picker_preview_dir
   selection=$(picker_list --tags ds)
   [ -z "$selection" ] && return
 
-  echo "vim +\$($PICKER get --line-start $selection) \$($PICKER get --file $selection)"
+  echo "vim +\$($PICKER get --record --line-start $selection) \$($PICKER get --file $selection)"
 }
 
 function picker_url() {
+  picker_preview_dir
   selection=$(picker_list --tags ds)
   [ -z "$selection" ] && return
 
-  echo "xdg-open \$($PICKER get --url $selection)"
+  echo "xdg-open \$($PICKER get --record --url $selection)"
 }
 
 function picker_sh_bind_wrapper() {
@@ -3,12 +3,13 @@
 "
 " :Author: Shengyu Zhang
 " :Date: 2021-04-12
-" :Version: 20211114
+" :Version: 20261018
 "
 
 function g:SphinxNotesPickerEdit(id)
-  let file = g:SphinxNotesPickerGet(a:id, 'file')[0]
-  let line = g:SphinxNotesPickerGet(a:id, 'line-start')[0]
+  let info = g:SphinxNotesPickerGetAll(a:id)
+  let file = info.file
+  let line = info.line_start
   if &modified
     execute 'vsplit ' . file
   else
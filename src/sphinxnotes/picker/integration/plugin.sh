@@ -3,18 +3,32 @@
 #
 # :Author: Shengyu Zhang
 # :Date: 2021-03-20
-# :Version: 20240828
+# :Version: 20261018
 
 # Make sure we have $PICKER
-[ -z "$PICKER"] && PICKER='sphinxnotes-picker'
+[ -z "$PICKER" ] && PICKER='sphinxnotes-picker'
+
+# Resolve directory of preview files once, previews are kept up to date by
+# builds if ``picker_export_previews`` is enabled.
+# Sets: $PICKER_PREVIEW_DIR
+function picker_preview_dir() {
+  if [ -z "$PICKER_PREVIEW_DIR" ]; then
+    PICKER_PREVIEW_DIR=$($PICKER export-previews)
+  fi
+}
 
 # Arguments: $*: Extra opts of ``picker list``
 # Returns: picker_id
 function picker_list() {
-  $PICKER list --width $(($(tput cols) - 2)) "$@" | \
+  # NOTE: Call picker_preview_dir in the current shell before capturing the
+  # output of picker_list, or it is resolved on every call
+  picker_preview_dir
+  $PICKER list --sort frecency --width $(($(tput cols) - 2)) "$@" | \
     fzf --with-nth 2..      \
         --no-hscroll        \
         --header-lines 1    \
+        --preview "cat $PICKER_PREVIEW_DIR/{1}.src" \
+        --preview-window down,wrap \
         --margin=2          \
         --border=rounded    \
         --height=60% | cut -d ' ' -f1
@@ -3,17 +3,20 @@
 "
 " :Author: Shengyu Zhang
 " :Date: 2021-04-01
-" :Version: 20211114
+" :Version: 20261018
 "
 " NOTE: junegunn/fzf.vim is required
 
 let s:picker = 'sphinxnotes-picker'
 let s:width = 0.9
 let s:height = 0.6
+" Directory of preview files, see g:SphinxNotesPickerPreviewDir
+let s:preview_dir = ''
 
 " Use fzf to list all snippets, callback with argument id.
 function g:SphinxNotesPickerList(tags, callback)
   let cmd = [s:picker, 'list',
+        \ '--sort', 'frecency',
         \ '--tags', a:tags,
         \ '--width', float2nr(&columns * s:width) - 2,
         \ ]
@@ -27,20 +30,53 @@ function g:SphinxNotesPickerList(tags, callback)
   endfunction
 
   " https://github.com/junegunn/fzf/blob/master/README-VIM.md#fzfrun
+  let preview_cmd = ['cat', g:SphinxNotesPickerPreviewDir() . '/{1}.src']
   call fzf#run({
         \ 'source': join(cmd, ' '),
         \ 'sink': function('List_CB'),
-        \ 'options': ['--with-nth', '2..', '--no-hscroll', '--header-lines', '1'],
+        \ 'options': ['--with-nth', '2..', '--no-hscroll', '--header-lines', '1',
+        \             '--preview', join(preview_cmd, ' '),
+        \             '--preview-window', 'down,wrap'],
         \ 'window': {'width': s:width, 'height': s:height},
         \ })
 endfunction
 
+" Return directory of preview files, which are named as '<id>.src' and
+" '<id>.text'. Previews are exported once per session, and are kept up to
+" date by builds if picker_export_previews is enabled.
+function g:SphinxNotesPickerPreviewDir()
+  if empty(s:preview_dir)
+    let s:preview_dir = trim(system(join([s:picker, 'export-previews'], ' ')))
+  endif
+  return s:preview_dir
+endfunction
+
 " Return the attribute value of specific snippet.
+" The snippet is selected by user, record it for listing by frecency.
 function g:SphinxNotesPickerGet(id, attr)
-    let cmd = [s:picker, 'get', a:id, '--' . a:attr]
+    let cmd = [s:picker, 'get', '--record', a:id, '--' . a:attr]
     return systemlist(join(cmd, ' '))
 endfunction
 
+" Return all attributes of specific snippet as a dict, in a single call.
+" The snippet is selected by user, record it for listing by frecency.
+function g:SphinxNotesPickerGetAll(id)
+    let cmd = [s:picker, 'get', '--record', '--json', a:id]
+    return json_decode(system(join(cmd, ' ')))
+endfunction
+
+" Return attribute value in the dict returned by g:SphinxNotesPickerGetAll,
+" as a list of lines like g:SphinxNotesPickerGet.
+function g:SphinxNotesPickerAttrLines(info, attr)
+    let val = get(a:info, substitute(a:attr, '-', '_', 'g'), v:null)
+    if type(val) == v:t_list
+        return val
+    elseif val is v:null
+        return []
+    endif
+    return [type(val) == v:t_string ? val : string(val)]
+endfunction
+
 " Use fzf to list all attr of specific snippet,
 " callback with arguments (attr_name, attr_value).
 function g:SphinxNotesPickerListPickerAttrs(id, callback)
@@ -59,13 +95,22 @@ function g:SphinxNotesPickerListPickerAttrs(id, callback)
         call add(table, attrs[name] . delim . name)
     endfor
 
+    " Fetch all attributes at once, and prepare previews of them in files,
+    " so that selecting and previewing never invoke picker again.
+    let info = g:SphinxNotesPickerGetAll(a:id)
+    let preview_dir = tempname()
+    call mkdir(preview_dir)
+    for opt in values(attrs)
+        call writefile(g:SphinxNotesPickerAttrLines(info, opt), preview_dir . '/' . opt)
+    endfor
+
     function! ListPickerAttrs_CB(selection) closure
         let opt = split(a:selection, ' ')[0]
-        let val = g:SphinxNotesPickerGet(a:id, opt)
+        let val = g:SphinxNotesPickerAttrLines(info, opt)
         call a:callback(opt, val) " finally call user's cb
     endfunction
 
-    let preview_cmd = [s:picker, 'get', a:id, '--$(echo {} | cut -d " " -f1)']
+    let preview_cmd = ['cat', preview_dir . '/{1}']
     let info_cmd = ['echo', 'Index ID:', a:id]
     call fzf#run({
                 \ 'source': table,
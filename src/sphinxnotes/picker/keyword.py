@@ -9,8 +9,15 @@ Helper functions for keywords extraction.
 """
 
 from __future__ import annotations
+from typing import Any
+import os
 import string
-from collections import Counter
+import pickle
+from collections import Counter, OrderedDict
+from functools import cached_property
+from hashlib import sha1
+
+from .utils.stats import stats
 
 
 class Extractor(object):
@@ -21,27 +28,43 @@ class Extractor(object):
     """
 
     def __init__(self):
-        # Import NLP libs here to prevent import overhead
-        import logging
+        self._punctuation = (
+            string.punctuation
+            + '！？｡。＂＃＄％＆＇（）＊＋，－／：；＜＝＞＠［＼］＾＿｀｛｜｝～｟｠｢｣､、〃》「」『』【】〔〕〖〗〘〙〚〛〜〝〞〟〰〾〿–—‘’‛“”„‟…‧﹏.·'
+        )
+
+    # NLP libs are slow to import and load, they are loaded on demand:
+    # the first time a text actually needs them.
+
+    @cached_property
+    def _detect_langs(self):
         from langid import rank
+
+        return rank
+
+    @cached_property
+    def _tokenize_zh_cn(self):
+        import logging
         from jieba_next import cut_for_search, setLogLevel
-        from pypinyin import lazy_pinyin
-        from wordsegment import load, segment
 
         # Turn off jieba debug log.
         # https://github.com/fxsjy/jieba/issues/255
         setLogLevel(logging.INFO)
 
+        return cut_for_search
+
+    @cached_property
+    def _tokenize_en(self):
+        from wordsegment import load, segment
+
         load()
-        self._detect_langs = rank
-        self._tokenize_zh_cn = cut_for_search
-        self._tokenize_en = segment
-        self._pinyin = lazy_pinyin
+        return segment
 
-        self._punctuation = (
-            string.punctuation
-            + '！？｡。＂＃＄％＆＇（）＊＋，－／：；＜＝＞＠［＼］＾＿｀｛｜｝～｟｠｢｣､、〃》「」『』【】〔〕〖〗〘〙〚〛〜〝〞〟〰〾〿–—‘’‛“”„‟…‧﹏.·'
-        )
+    @cached_property
+    def _pinyin(self):
+        from pypinyin import lazy_pinyin
+
+        return lazy_pinyin
 
     def extract(self, text: str, top_n: int | None = None) -> list[str]:
         """Return keywords of given text."""
@@ -82,15 +105,18 @@ class Extractor(object):
 
     def tokenize(self, text: str) -> list[str]:
         # Get top most 5 langs
-        langs = self._detect_langs(text)[:5]
+        with stats.timer('langid'):
+            langs = self._detect_langs(text)[:5]
         tokens = [text]
         new_tokens = []
         for lang in langs:
             for token in tokens:
                 if lang[0] == 'zh':
-                    new_tokens += self._tokenize_zh_cn(token)
+                    with stats.timer('jieba'):
+                        new_tokens += self._tokenize_zh_cn(token)
                 elif lang[0] == 'en':
-                    new_tokens += self._tokenize_en(token)
+                    with stats.timer('wordsegment'):
+                        new_tokens += self._tokenize_en(token)
                 else:
                     new_tokens += token.split(' ')
             tokens = new_tokens
@@ -98,7 +124,122 @@ class Extractor(object):
         return tokens
 
     def trans_to_pinyin(self, word: str) -> str | None:
-        return ' '.join(self._pinyin(word, errors='ignore'))
+        if word.isascii():
+            return None  # No Chinese character, save loading pypinyin
+        with stats.timer('pinyin'):
+            return ' '.join(self._pinyin(word, errors='ignore'))
 
     def strip_invalid_token(self, tokens: list[str]) -> list[str]:
         return [token for token in tokens if token != '']
+
+
+#: Extractor of current process, see :func:`get_extractor`.
+_extractor: Extractor | None = None
+
+
+def get_extractor() -> Extractor:
+    """Return the extractor of current process, create it on demand."""
+    global _extractor
+    if _extractor is None:
+        _extractor = Extractor()
+    return _extractor
+
+
+def _extract_batch(texts: list[str]) -> list[list[str]]:
+    extractor = get_extractor()
+    return [extractor.extract(text) for text in texts]
+
+
+def _extract_batch_with_stats(
+    texts: list[str],
+) -> tuple[list[list[str]], dict[str, Any]]:
+    # Stats of worker process are sent back with result
+    stats.reset()
+    return _extract_batch(texts), stats.snapshot()
+
+
+def extract_many(
+    texts: list[str], workers: int = 1, batch_size: int = 64
+) -> list[list[str]]:
+    """
+    Return keywords of every given text.
+
+    When there are more texts than a batch, they are extracted in batches on
+    a pool of processes, every worker process creates its extractor once.
+    """
+    # More workers than CPUs only adds the cost of loading NLP libs
+    workers = min(workers, os.cpu_count() or 1)
+    if workers <= 1 or len(texts) <= batch_size:
+        return _extract_batch(texts)
+
+    # NOTE: Importing is slow, do it on demand.
+    from concurrent.futures import ProcessPoolExecutor
+
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ProcessPoolExecutor(
+        min(workers, len(batches)), initializer=get_extractor
+    ) as pool:
+        result = []
+        for batch, snapshot in pool.map(_extract_batch_with_stats, batches):
+            result.extend(batch)
+            stats.merge(snapshot)
+        return result
+
+
+class KeywordCache(object):
+    """
+    A persistent, bounded memo of extracted keywords, keyed by hash of text.
+    Least recently used entries are evicted when it is full.
+    """
+
+    #: Bump it when :class:`Extractor` generates different keywords.
+    VERSION = 1
+
+    filename: str
+    capacity: int
+    hits: int
+    misses: int
+    _memo: OrderedDict[bytes, list[str]]
+
+    def __init__(self, filename: str, capacity: int) -> None:
+        self.filename = filename
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._memo)
+
+    def get(self, text: str) -> list[str] | None:
+        key = self._hash(text)
+        if (keywords := self._memo.get(key)) is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._memo.move_to_end(key)
+        return keywords
+
+    def put(self, text: str, keywords: list[str]) -> None:
+        key = self._hash(text)
+        self._memo[key] = keywords
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.capacity:
+            self._memo.popitem(last=False)
+
+    def load(self) -> None:
+        with open(self.filename, 'rb') as f:
+            version, memo = pickle.load(f)
+        if version == self.VERSION:
+            self._memo = memo
+
+    def dump(self) -> None:
+        # Write to a temporary file then rename it, so that concurrent
+        # builds never see a partially written file.
+        tmpfile = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmpfile, 'wb') as f:
+            pickle.dump((self.VERSION, self._memo), f)
+        os.replace(tmpfile, self.filename)
+
+    def _hash(self, text: str) -> bytes:
+        return sha1(text.encode()).digest()
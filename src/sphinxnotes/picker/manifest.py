@@ -0,0 +1,128 @@
+"""
+sphinxnotes.picker.manifest
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Manifest of picked documents, which records the source and dependent files
+of every document when it is picked, so that outdated documents can be found
+without touching the snippet cache.
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, replace
+import os
+import pickle
+from hashlib import sha1
+
+#: (mtime in nanoseconds, size) of file, None if file does not exist.
+Stat = tuple[int, int] | None
+
+
+def stat(file: str) -> Stat:
+    try:
+        st = os.stat(file)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def digest(file: str) -> str | None:
+    """Return hash of file content, None if file can not be read."""
+    try:
+        with open(file, 'rb') as f:
+            return sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+@dataclass(frozen=True)
+class Entry(object):
+    """State of a document when it is picked."""
+
+    #: Absolute path to the source file.
+    file: str
+    #: Stat of source file.
+    stat: Stat
+    #: Hash of source file content, it is compared when the stat changes, so
+    #: that touched but unchanged files are not rebuilt.
+    digest: str | None
+    #: Absolute path of dependent file -> stat of it.
+    deps: dict[str, Stat]
+    #: Item name of document in snippet cache, None if no snippet is picked.
+    itemname: str | None
+    #: Hash of picked snippets, None if document is not picked.
+    fingerprint: str | None
+
+
+class Manifest(object):
+    """A docname -> :class:`Entry` manifest of a project."""
+
+    #: Bump it when the format of :class:`Entry` changes.
+    VERSION = 2
+
+    filename: str
+    entries: dict[str, Entry]
+    #: Whether the manifest is changed since it is loaded.
+    dirty: bool
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.entries = {}
+        self.dirty = False
+
+    def record(
+        self,
+        docname: str,
+        file: str,
+        deps: list[str],
+        itemname: str | None,
+        fingerprint: str | None,
+    ) -> None:
+        """Record the current state of picked document."""
+        self.entries[docname] = Entry(
+            file=file,
+            stat=stat(file),
+            digest=digest(file),
+            deps={dep: stat(dep) for dep in deps},
+            itemname=itemname,
+            fingerprint=fingerprint,
+        )
+        self.dirty = True
+
+    def remove(self, docname: str) -> None:
+        if self.entries.pop(docname, None):
+            self.dirty = True
+
+    def is_outdated(self, docname: str) -> bool:
+        """
+        Return whether the document is never picked, or its source file or
+        any of its dependent files is changed since it is picked.
+        """
+        if not (entry := self.entries.get(docname)):
+            return True
+        if (st := stat(entry.file)) != entry.stat:
+            if st is None or digest(entry.file) != entry.digest:
+                return True
+            # Touched but unchanged, remember the new stat
+            self.entries[docname] = replace(entry, stat=st)
+            self.dirty = True
+        return any(stat(dep) != st for dep, st in entry.deps.items())
+
+    def load(self) -> None:
+        with open(self.filename, 'rb') as f:
+            version, entries = pickle.load(f)
+        if version == self.VERSION:
+            self.entries = entries
+        self.dirty = False
+
+    def dump(self) -> None:
+        # Write to a temporary file then rename it, so that concurrent
+        # builds never see a partially written file.
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        tmpfile = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmpfile, 'wb') as f:
+            pickle.dump((self.VERSION, self.entries), f)
+        os.replace(tmpfile, self.filename)
+        self.dirty = False
@@ -15,7 +15,8 @@ from docutils import nodes
 
 from sphinx.util import logging
 
-from .snippets import Snippet, Section, Document, Code
+from .snippets import Snippet, Section, Document, Code, source_lines_cache
+from .utils import titlepath
 
 if TYPE_CHECKING:
     from sphinx.application import Sphinx
@@ -24,14 +25,21 @@ logger = logging.getLogger(__name__)
 
 
 def pick(
-    app: Sphinx, doctree: nodes.document, docname: str
-) -> list[tuple[Snippet, nodes.Element]]:
+    app: Sphinx,
+    doctree: nodes.document,
+    docname: str,
+    doctitles: list[str] | None = None,
+) -> list[tuple[Snippet, nodes.Element, list[str]]]:
     """
-    Pick snippets from document, return a list of snippet and the related node.
+    Pick snippets from document, return a list of snippet, the related node
+    and the title path of snippet.
 
     As :class:`Snippet` can not hold any refs to doctree, we additionly returns
     the related nodes here. To ensure the caller can back reference to original
-    document node and do more things (e.g. generate title path).
+    document node and do more things.
+
+    :param doctitles: Texts of titles of documents that contain the document,
+        innermost first. Resolved from environment if not given.
     """
     # FIXME: Why doctree.source is always None?
     if not doctree.attributes.get('source'):
@@ -45,8 +53,12 @@ def pick(
 
     # Walk doctree and pick snippets.
 
-    picker = SnippetPicker(doctree)
-    doctree.walkabout(picker)
+    if doctitles is None:
+        doctitles = [t.astext() for t in titlepath.resolve_document(app.env, docname)]
+    picker = SnippetPicker(doctree, doctitles)
+    # Source file of document is read once for all snippets in it
+    with source_lines_cache():
+        doctree.walkabout(picker)
 
     return picker.snippets
 
@@ -54,16 +66,42 @@ def pick(
 class SnippetPicker(nodes.SparseNodeVisitor):
     """Node visitor for picking snippets from document."""
 
-    #: List of picked snippets and the section it belongs to
-    snippets: list[tuple[Snippet, nodes.Element]]
+    #: List of picked snippets, the section it belongs to and its title path
+    snippets: list[tuple[Snippet, nodes.Element, list[str]]]
+
+    #: Stack of nested sections and number of their subsections.
+    _sections: list[tuple[nodes.section, list[int]]]
 
-    #: Stack of nested sections.
-    _sections: list[nodes.section]
+    #: Stack of nodes that have title and the texts of titles, it is
+    #: maintained during walking so no upward traversal is needed.
+    _titles: list[tuple[nodes.Element, str]]
 
-    def __init__(self, doctree: nodes.document) -> None:
+    #: Title path of the document, see :func:`pick`.
+    _doctitles: list[str]
+
+    def __init__(self, doctree: nodes.document, doctitles: list[str]) -> None:
         super().__init__(doctree)
         self.snippets = []
         self._sections = []
+        self._titles = []
+        self._doctitles = doctitles
+
+    def dispatch_visit(self, node: nodes.Node) -> None:
+        if (
+            isinstance(node, nodes.Element)
+            and len(node) > 0
+            and isinstance(node[0], nodes.title)
+        ):
+            self._titles.append((node, node[0].astext()))
+        try:
+            super().dispatch_visit(node)
+        except nodes.SkipNode:
+            self._pop_title(node)  # No departure
+            raise
+
+    def dispatch_departure(self, node: nodes.Node) -> None:
+        super().dispatch_departure(node)
+        self._pop_title(node)
 
     ###################
     # Visitor methods #
@@ -75,23 +113,27 @@ class SnippetPicker(nodes.SparseNodeVisitor):
         except ValueError as e:
             logger.debug(f'skip {node}: {e}')
             raise nodes.SkipNode
-        self.snippets.append((code, node))
+        self.snippets.append((code, node, self._titlepath()))
 
     def visit_section(self, node: nodes.section) -> None:
-        self._sections.append(node)
+        if self._sections and node.parent is self._sections[-1][0]:
+            self._sections[-1][1][0] += 1
+        self._sections.append((node, [0]))
 
     def depart_section(self, node: nodes.section) -> None:
-        section = self._sections.pop()
+        section, (num_subsection,) = self._sections.pop()
         assert section == node
 
+        # Title of section itself is excluded from its title path
+        tpath = self._titlepath()[1:]
         # Always pick document.
         if len(self._sections) == 0:
-            self.snippets.append((Document(self.document), node))
+            self.snippets.append((Document(self.document), node, tpath))
             return
         # Skip non-leaf section without content
-        if self._is_empty_non_leaf_section(node):
+        if self._is_empty_non_leaf_section(node, num_subsection):
             return
-        self.snippets.append((Section(node), node))
+        self.snippets.append((Section(node), node, tpath))
 
     def unknown_visit(self, node: nodes.Node) -> None:
         pass  # Ignore any unknown node
@@ -103,14 +145,21 @@ class SnippetPicker(nodes.SparseNodeVisitor):
     # Helper methods #
     ##################
 
-    def _is_empty_non_leaf_section(self, node: nodes.section) -> bool:
+    def _is_empty_non_leaf_section(
+        self, node: nodes.section, num_subsection: int
+    ) -> bool:
         """
         A section is a leaf section it has non-child section.
         A section is empty when it has not non-section child node
         (except the title).
         """
-        num_subsection = len(
-            list(node[0].traverse(nodes.section, descend=False, siblings=True))
-        )
         num_nonsection_child = len(node) - num_subsection - 1  # -1 for title
         return num_subsection != 0 and num_nonsection_child == 0
+
+    def _pop_title(self, node: nodes.Node) -> None:
+        if self._titles and self._titles[-1][0] is node:
+            self._titles.pop()
+
+    def _titlepath(self) -> list[str]:
+        """Return title path of current node, innermost title first."""
+        return [text for _, text in reversed(self._titles)] + self._doctitles
@@ -0,0 +1,119 @@
+"""
+sphinxnotes.picker.search
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Ranked search on inverted index of keywords, scored by Okapi BM25.
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+# **NOTE**: This module is used by CLI, import new packages with caution.
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable, Protocol
+from collections import Counter
+import heapq
+import math
+
+if TYPE_CHECKING:
+    from .indexfile import Row
+
+# Free parameters of BM25, the commonly used values.
+K1 = 1.2
+B = 0.75
+
+
+def terms(keywords: Iterable[str]) -> list[str]:
+    """
+    Return the terms to be indexed of given keywords.
+
+    Keywords that consist of multiple words (such as pinyin "ni hao") are
+    indexed both by every word and by the concatenated form, so that they
+    can be queried either way.
+    """
+    result = []
+    for keyword in keywords:
+        words = keyword.lower().split()
+        result.extend(words)
+        if len(words) > 1:
+            result.append(''.join(words))
+    return result
+
+
+def parse_query(query: str) -> list[str]:
+    """Split query into terms, duplicated terms are removed."""
+    return list(dict.fromkeys(query.lower().split()))
+
+
+class InvertedIndex(Protocol):
+    """Term -> rows mapping, rows are referred by their numbers."""
+
+    def __len__(self) -> int: ...
+
+    def total_length(self) -> int:
+        """Return the total number of terms of all rows."""
+        ...
+
+    def postings(self, term: str) -> list[tuple[int, int]]:
+        """Return (row number, term frequency) of rows that contain the term."""
+        ...
+
+    def length(self, n: int) -> int:
+        """Return the number of terms of the n-th row."""
+        ...
+
+    def row(self, n: int) -> Row:
+        """Return the n-th row."""
+        ...
+
+
+class MemoryInvertedIndex(object):
+    """An :class:`InvertedIndex` built in memory, used when no index file."""
+
+    def __init__(self, rows: Iterable[Row]) -> None:
+        self._rows = []
+        self._lengths = []
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        for n, row in enumerate(rows):
+            tfs = Counter(terms(row[1][3]))
+            for term, tf in tfs.items():
+                self._postings.setdefault(term, []).append((n, tf))
+            self._rows.append(row)
+            self._lengths.append(sum(tfs.values()))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def total_length(self) -> int:
+        return sum(self._lengths)
+
+    def postings(self, term: str) -> list[tuple[int, int]]:
+        return self._postings.get(term, [])
+
+    def length(self, n: int) -> int:
+        return self._lengths[n]
+
+    def row(self, n: int) -> Row:
+        return self._rows[n]
+
+
+def search(index: InvertedIndex, query: str, limit: int) -> list[tuple[float, Row]]:
+    """Return the top *limit* rows that match the query, with their scores."""
+    num_rows = len(index)
+    if num_rows == 0:
+        return []
+    avg_length = index.total_length() / num_rows
+
+    scores: dict[int, float] = {}
+    for term in parse_query(query):
+        postings = index.postings(term)
+        if not postings:
+            continue
+        df = len(postings)
+        idf = math.log((num_rows - df + 0.5) / (df + 0.5) + 1)
+        for n, tf in postings:
+            norm = K1 * (1 - B + B * index.length(n) / avg_length)
+            scores[n] = scores.get(n, 0) + idf * tf * (K1 + 1) / (tf + norm)
+
+    top = heapq.nlargest(limit, scores.items(), key=lambda x: x[1])
+    return [(score, index.row(n)) for n, score in top]
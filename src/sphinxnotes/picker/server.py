@@ -0,0 +1,112 @@
+"""
+sphinxnotes.picker.server
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+A resident server that answers CLI requests over Unix domain socket, so that
+the config and cache are loaded once rather than in every CLI call.
+
+The protocol is newline delimited JSON, a connection carries exactly one
+request and one response::
+
+   -> {"command": "list", "args": {"tags": "*", ...}, "config": "/path/conf.py"}
+   <- {"status": 0, "stdout": "...", "stderr": ""}
+
+Server rejects requests made with other config file than its own by
+responding ``{"rejected": true}``, the client should handle them by itself.
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+# **NOTE**: This module is used by CLI, import new packages with caution.
+from __future__ import annotations
+from typing import Any, Callable
+import os
+from os import path
+import json
+import socket
+
+#: Name of socket file under cache directory.
+SOCKET_NAME = 'server.sock'
+
+Request = dict[str, Any]
+Response = dict[str, Any]
+
+
+def socket_path(cache_dir: str) -> str:
+    return path.join(cache_dir, SOCKET_NAME)
+
+
+def request(sockpath: str, req: Request, timeout: float = 5) -> Response:
+    """
+    Send request to server and wait for response.
+
+    :raise OSError: when server is not running.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(sockpath)
+        sock.sendall(json.dumps(req).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f'no response from server {sockpath}')
+    return json.loads(line)
+
+
+def listen(sockpath: str) -> socket.socket:
+    """
+    Create a listening socket at given path.
+
+    :raise RuntimeError: when another server is running at the path.
+    """
+    try:
+        request(sockpath, {'command': 'ping', 'args': {}}, timeout=1)
+    except OSError:
+        # Remove socket file left by a dead server
+        if path.exists(sockpath):
+            os.remove(sockpath)
+    else:
+        raise RuntimeError(f'server is already running at {sockpath}')
+
+    os.makedirs(path.dirname(sockpath), exist_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(sockpath)
+    os.chmod(sockpath, 0o600)
+    sock.listen()
+    return sock
+
+
+def serve(
+    sock: socket.socket, handle: Callable[[Request], Response], timeout: float = 5
+) -> None:
+    """
+    Serve requests until interrupted, requests are handled one by one.
+    The socket file is removed when exiting.
+
+    :param timeout: Connection is dropped if client doesn't send request or
+       receive response in time, so that it never blocks other clients.
+    """
+    sockpath = sock.getsockname()
+    try:
+        while True:
+            conn, _ = sock.accept()
+            conn.settimeout(timeout)
+            with conn, conn.makefile('rwb') as f:
+                try:
+                    line = f.readline()
+                except OSError:
+                    continue  # Client is too slow or has gone
+                try:
+                    req = json.loads(line)
+                    resp = handle(req)
+                except Exception as e:
+                    resp = {'status': 1, 'stdout': '', 'stderr': f'{e!r}\n'}
+                try:
+                    f.write(json.dumps(resp).encode() + b'\n')
+                    f.flush()
+                except OSError:
+                    pass  # Client has gone
+    finally:
+        sock.close()
+        os.remove(sockpath)
@@ -9,8 +9,8 @@ Definitions of various snippets.
 """
 
 from __future__ import annotations
-from typing import TYPE_CHECKING
-import itertools
+from typing import TYPE_CHECKING, Iterator
+from contextlib import contextmanager
 from os import path
 import sys
 from pygments.lexers.shell import BashSessionLexer
@@ -28,11 +28,11 @@ class Snippet(object):
 
     :param nodes: nodes of doctree that make up this snippet.
 
-    .. warning::
+    .. note::
 
-       Snippet will be persisted to disk via pickle, to keep it simple,
-       it CAN NOT holds reference to any doctree ``nodes``
-       (or even any non-std module).
+       Snippet is not persisted directly, its data is copied to a plain
+       :class:`~.cache.Record`, so that reading cache never imports this
+       module (and docutils, pygments).
     """
 
     #: docname where the snippet is located, can be referenced by
@@ -84,13 +84,10 @@ class Snippet(object):
             lineno[1] = max(lineno[1], _line_of_end(node))
         self.lineno = (lineno[0], lineno[1])
 
-        source = []
-        with open(self.file, 'r') as f:
-            start = self.lineno[0] - 1
-            stop = self.lineno[1] - 1
-            for line in itertools.islice(f, start, stop):
-                source.append(line.strip('\n'))
-        self.source = source
+        start, stop = self.lineno[0] - 1, self.lineno[1] - 1
+        if start < 0 or stop < 0:
+            raise ValueError(f'Nodes {nodes} have invalid line range {self.lineno}')
+        self.source = _read_lines(self.file)[start:stop]
 
         text = []
         for node in nodes:
@@ -235,6 +232,42 @@ def _line_of_end(node: nodes.Node) -> int:
         )
     # No line found, return the max line of source file
     if node.source and path.exists(node.source):
-        with open(node.source) as f:
-            return sum(1 for _ in f)
+        return len(_read_lines(node.source))
     raise AttributeError('None source attr of node %s' % node)
+
+
+################
+# Source lines #
+################
+
+#: Source file -> lines of it, available in :func:`source_lines_cache`.
+_source_lines: dict[str, list[str]] | None = None
+
+
+@contextmanager
+def source_lines_cache() -> Iterator[None]:
+    """
+    Within the context, every source file is read once and its lines are
+    shared by all snippets (and line number lookups), rather than reread for
+    every snippet. Lines are dropped when exiting the context.
+    """
+    global _source_lines
+    outer = _source_lines
+    _source_lines = {} if outer is None else outer
+    try:
+        yield
+    finally:
+        _source_lines = outer
+
+
+def _read_lines(file: str) -> list[str]:
+    """Return lines of file without line endings."""
+    if _source_lines is not None and (lines := _source_lines.get(file)) is not None:
+        return lines
+    with open(file, 'r') as f:
+        lines = f.read().split('\n')
+    if lines[-1] == '':
+        lines.pop()  # Text after the last line ending
+    if _source_lines is not None:
+        _source_lines[file] = lines
+    return lines
@@ -7,7 +7,7 @@ sphinxnotes.picker.table
 """
 
 from __future__ import annotations
-from typing import Iterable
+from typing import Iterable, Iterator
 
 from .cache import Index, IndexID
 from .utils import ellipsis
@@ -40,18 +40,45 @@ def tablify(indexes: Iterable[tuple[IndexID, Index]], width: int) -> Iterable[st
     )
     yield header
 
+    # Rows of a document share the same few tags and title paths
+    kinds: dict[str, str] = {}
+    paths: dict[tuple[str, ...], str] = {}
+
     # Write rows
     for index_id, index in indexes:
         # TODO: assert index?
+        if (kind := kinds.get(index[0])) is None:
+            kind = kinds[index[0]] = ellipsis.ellipsis(
+                f'[{index[0]}]', tags_width, blank_sym=' '
+            )
+        if (tpath := paths.get(key := tuple(index[2]))) is None:
+            tpath = paths[key] = ellipsis.join(
+                index[2], path_width, path_comp_width, blank_sym=' '
+            )
         row = COLUMN_DELIMITER.join(
             [
                 index_id,  # ID
-                ellipsis.ellipsis(f'[{index[0]}]', tags_width, blank_sym=' '),  # Kind
+                kind,  # Kind
                 ellipsis.ellipsis(index[1], excerpt_width, blank_sym=' '),  # Excerpt
-                ellipsis.join(
-                    index[2], path_width, path_comp_width, blank_sym=' '
-                ),  # Titleppath
+                tpath,  # Titleppath
                 ','.join(index[3]),
             ]
         )  # Keywords
         yield row
+
+
+def render(
+    indexes: Iterable[tuple[IndexID, Index]], width: int, batch_size: int = 1024
+) -> Iterator[str]:
+    """
+    Like :func:`tablify`, but rows are joined in batches, every batch is a
+    newline terminated string, which is much cheaper to write than rows.
+    """
+    batch = []
+    for row in tablify(indexes, width):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
@@ -4,32 +4,101 @@ sphinxnotes.utils.ellipsis
 
 Utils for ellipsis string.
 
+Display width of every character is looked up once and cached, a string is
+measured, truncated and padded in a single pass over its characters.
+
 :copyright: Copyright 2020 Shengyu Zhang
 :license: BSD, see LICENSE for details.
 """
 
 from __future__ import annotations
-from wcwidth import wcswidth
+from typing import Sequence
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import accumulate
+from wcwidth import wcwidth, wcswidth
+
+_ZWJ = '\u200d'  # Zero Width Joiner
+_VS16 = '\ufe0f'  # Variation Selector 16
+
+
+def char_width(c: str) -> int:
+    """Return display width of character, control characters are 0 width."""
+    return max(wcwidth(c), 0)
+
+
+class _WidthTable(dict):
+    """
+    Code point -> width (as a character) table for :meth:`str.translate`,
+    filled on demand.
+    """
+
+    def __missing__(self, key: int) -> str:
+        self[key] = w = chr(char_width(chr(key)))
+        return w
+
+
+_WIDTH_TABLE = _WidthTable()
+
+
+@lru_cache(maxsize=1024)
+def _vs16_width(c: str) -> int:
+    # Width that VS16 adds to the preceding character
+    return max(wcswidth(c + _VS16), 0) - char_width(c)
+
+
+def widths(text: str) -> Sequence[int]:
+    """Return display widths of every character of text."""
+    if _ZWJ not in text and _VS16 not in text:
+        # Translate characters to their widths in C
+        return text.translate(_WIDTH_TABLE).encode('latin-1')
+
+    # Same as wcswidth: character joined by ZWJ is not measured, and VS16 may
+    # widen the last measured character.
+    result = [0] * len(text)
+    last = None
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == _ZWJ:
+            i += 2
+            continue
+        if c == _VS16 and last:
+            result[i] = _vs16_width(last)
+            last = None
+        else:
+            result[i] = char_width(c)
+            if result[i] > 0:
+                last = c
+        i += 1
+    return result
+
+
+def str_width(text: str) -> int:
+    """Return display width of text."""
+    if text.isascii() and text.isprintable():
+        return len(text)
+    return sum(widths(text))
 
 
 def ellipsis(
     text: str, width: int, ellipsis_sym: str = '..', blank_sym: str | None = None
 ) -> str:
-    text_width = wcswidth(text)
+    ws = widths(text)
+    text_width = sum(ws)
     if text_width <= width:
         if blank_sym:
             # Padding with blank_sym
-            text += blank_sym * ((width - text_width) // wcswidth(blank_sym))
+            text += blank_sym * ((width - text_width) // str_width(blank_sym))
         return text
-    width -= wcswidth(ellipsis_sym)
+    width -= str_width(ellipsis_sym)
     if width > text_width:
         width = text_width
-    i = 0
-    new_text = ''
-    while wcswidth(new_text) < width:
-        new_text += text[i]
-        i += 1
-    return new_text + ellipsis_sym
+    if width <= 0:
+        return ellipsis_sym
+    # Take the shortest prefix whose width reaches the limit
+    i = bisect_left(list(accumulate(ws)), width) + 1
+    return text[:i] + ellipsis_sym
 
 
 def join(
@@ -41,16 +110,17 @@ def join(
     blank_sym: str | None = None,
 ):
     # TODO: position
-    total_width -= wcswidth(ellipsis_sym)
+    total_width -= str_width(ellipsis_sym)
+    sep_width = str_width(separate_sym)
     result = []
     for i, ln in enumerate(lst):
         ln = ellipsis(ln, title_width, ellipsis_sym=ellipsis_sym, blank_sym=None)
-        l_width = wcswidth(ln) + (wcswidth(separate_sym) if i != 0 else 0)
+        l_width = str_width(ln) + (sep_width if i != 0 else 0)
         if total_width - l_width < 0:
             break
         result.append(ln)
         total_width -= l_width
     s = separate_sym.join(result)
     if blank_sym:
-        s += blank_sym * (total_width // wcswidth(blank_sym))
+        s += blank_sym * (total_width // str_width(blank_sym))
     return s
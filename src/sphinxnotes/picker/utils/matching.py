@@ -0,0 +1,80 @@
+"""
+sphinxnotes.utils.matching
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Lightweight shell-style glob matcher for docnames, behaves the same as
+:func:`sphinx.util.matching.patmatch` without importing Sphinx.
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+# **NOTE**: This module is used by CLI, import new packages with caution.
+from __future__ import annotations
+from functools import lru_cache
+import re
+
+_WILDCARDS = '*?['
+
+
+def translate(pat: str) -> str:
+    """
+    Translate a shell-style glob pattern to a regular expression.
+
+    Single star and question mark don't match slashes, double star matches
+    slashes too.
+    """
+    i, n = 0, len(pat)
+    res = ''
+    while i < n:
+        c = pat[i]
+        i += 1
+        if c == '*':
+            if i < n and pat[i] == '*':
+                i += 1
+                res += '.*'
+            else:
+                res += '[^/]*'
+        elif c == '?':
+            res += '[^/]'
+        elif c == '[':
+            j = i
+            if j < n and pat[j] == '!':
+                j += 1
+            if j < n and pat[j] == ']':
+                j += 1
+            while j < n and pat[j] != ']':
+                j += 1
+            if j >= n:
+                res += '\\['
+            else:
+                stuff = pat[i:j].replace('\\', '\\\\')
+                i = j + 1
+                if stuff[0] == '!':
+                    # Negative pattern mustn't match slashes too
+                    stuff = '^/' + stuff[1:]
+                elif stuff[0] == '^':
+                    stuff = '\\' + stuff
+                res += f'[{stuff}]'
+        else:
+            res += re.escape(c)
+    return res + '$'
+
+
+@lru_cache(maxsize=None)
+def compile_pattern(pat: str) -> re.Pattern[str]:
+    """Compile glob pattern, the compiled pattern is cached."""
+    return re.compile(translate(pat))
+
+
+def patmatch(name: str, pat: str) -> bool:
+    """Return whether name matches the glob pattern."""
+    return compile_pattern(pat).match(name) is not None
+
+
+def literal_prefix(pat: str) -> str:
+    """Return the longest prefix of pattern that contains no wildcard."""
+    for i, c in enumerate(pat):
+        if c in _WILDCARDS:
+            return pat[:i]
+    return pat
@@ -9,34 +9,329 @@ A customized persistent KV store for Sphinx project.
 """
 
 from __future__ import annotations
+import io
 import os
 from os import path
-from typing import Iterator, TypeVar
+from typing import Any, Iterator, TypeVar, ContextManager
 import pickle
 from collections.abc import MutableMapping
+from contextlib import contextmanager, nullcontext, suppress
 from hashlib import sha1
 
+from .stats import stats
+
 K = TypeVar('K')
 V = TypeVar('V')
 
 
+class Backend(object):
+    """
+    Storage backend of :class:`PDict`.
+
+    A backend is a flat namespace of named binary blobs, PDict decides what
+    to store and how to (de)serialize them.
+    """
+
+    #: Whether the backend stores entries, see :meth:`write_entry`.
+    ENTRIES = False
+
+    dirname: str
+
+    def __init__(self, dirname: str) -> None:
+        self.dirname = dirname
+
+    def read(self, name: str) -> bytes:
+        """Return content of blob, raise :exc:`FileNotFoundError` if not exists."""
+        raise NotImplementedError
+
+    def read_range(self, name: str, offset: int, length: int) -> bytes:
+        """Like :meth:`read`, but only return a range of content."""
+        return self.read(name)[offset : offset + length]
+
+    def write(self, name: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def append(self, name: str, data: bytes) -> None:
+        """Append data to blob, create it if not exists."""
+        raise NotImplementedError
+
+    def remove(self, name: str) -> None:
+        raise NotImplementedError
+
+    def mtime(self, name: str) -> float:
+        """Return modification time of blob, raise :exc:`OSError` if not exists."""
+        raise NotImplementedError
+
+    def entries(self) -> Iterator[bytes]:
+        """Iterate over data of all entries."""
+        raise NotImplementedError
+
+    def write_entry(self, name: str, data: bytes) -> None:
+        """
+        Write an entry, which is a small record of item that is read
+        together with all other entries, see :meth:`PDict.summarize`.
+        """
+        raise NotImplementedError
+
+    def remove_entry(self, name: str) -> None:
+        raise NotImplementedError
+
+    def clear_entries(self) -> None:
+        raise NotImplementedError
+
+    def transaction(self) -> ContextManager:
+        """Return a context manager, writes in it are committed as a batch."""
+        return nullcontext()
+
+    def close(self) -> None:
+        pass
+
+
+class FileBackend(Backend):
+    """Store every blob as a single file under :attr:`dirname`."""
+
+    def read(self, name: str) -> bytes:
+        with open(path.join(self.dirname, name), 'rb') as f:
+            return f.read()
+
+    def read_range(self, name: str, offset: int, length: int) -> bytes:
+        with open(path.join(self.dirname, name), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def write(self, name: str, data: bytes) -> None:
+        # Makesure dir exists
+        if not path.exists(self.dirname):
+            os.makedirs(self.dirname)
+        # Write to a temporary file then rename it, so that readers never see
+        # a partially written file.
+        filename = path.join(self.dirname, name)
+        tmpfile = f'{filename}.{os.getpid()}.tmp'
+        with open(tmpfile, 'wb') as f:
+            f.write(data)
+        os.replace(tmpfile, filename)
+
+    def append(self, name: str, data: bytes) -> None:
+        # Makesure dir exists
+        if not path.exists(self.dirname):
+            os.makedirs(self.dirname)
+        with open(path.join(self.dirname, name), 'ab') as f:
+            f.write(data)
+
+    def remove(self, name: str) -> None:
+        os.remove(path.join(self.dirname, name))
+
+    def mtime(self, name: str) -> float:
+        return path.getmtime(path.join(self.dirname, name))
+
+
+class SQLiteBackend(Backend):
+    """
+    Store all blobs as rows of a single SQLite database file, and entries as
+    rows of a separated table.
+
+    Appended data is stored as separated chunks rather than concatenated to
+    the blob in place, which costs rewriting the whole blob.
+    """
+
+    ENTRIES = True
+    DBFILE = 'cache.sqlite3'
+
+    def __init__(self, dirname: str) -> None:
+        super().__init__(dirname)
+        self._conn = None
+
+    def _connect(self, create: bool = False):
+        if self._conn is not None:
+            return self._conn
+        # NOTE: Importing is slow, do it on demand.
+        import sqlite3
+
+        dbfile = path.join(self.dirname, self.DBFILE)
+        if not path.exists(dbfile):
+            if not create:
+                raise FileNotFoundError(f'No such database: {dbfile!r}')
+            if not path.exists(self.dirname):
+                os.makedirs(self.dirname)
+        self._conn = sqlite3.connect(dbfile)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS blobs ('
+            'name TEXT PRIMARY KEY, data BLOB NOT NULL, mtime REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS chunks ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, '
+            'data BLOB NOT NULL, mtime REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS chunks_name ON chunks (name, seq)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'name TEXT PRIMARY KEY, data BLOB NOT NULL)'
+        )
+        return self._conn
+
+    def _row(self, column: str, name: str):
+        row = (
+            self._connect()
+            .execute(f'SELECT {column} FROM blobs WHERE name = ?', (name,))
+            .fetchone()
+        )
+        if row is None:
+            raise FileNotFoundError(f'No such blob: {name!r}')
+        return row[0]
+
+    def read(self, name: str) -> bytes:
+        conn = self._connect()
+        row = conn.execute('SELECT data FROM blobs WHERE name = ?', (name,)).fetchone()
+        chunks = conn.execute(
+            'SELECT data FROM chunks WHERE name = ? ORDER BY seq', (name,)
+        ).fetchall()
+        if row is None and not chunks:
+            raise FileNotFoundError(f'No such blob: {name!r}')
+        return b''.join([row[0] if row else b''] + [c[0] for c in chunks])
+
+    def read_range(self, name: str, offset: int, length: int) -> bytes:
+        conn = self._connect()
+        if conn.execute('SELECT 1 FROM chunks WHERE name = ?', (name,)).fetchone():
+            # Range may span appended chunks, read the whole blob
+            return super().read_range(name, offset, length)
+        # substr() of SQLite is 1-indexed
+        return self._row(f'substr(data, {offset + 1}, {length})', name)
+
+    def write(self, name: str, data: bytes) -> None:
+        # NOTE: Importing is slow, do it on demand.
+        import time
+
+        conn = self._connect(create=True)
+        conn.execute(
+            'INSERT OR REPLACE INTO blobs (name, data, mtime) VALUES (?, ?, ?)',
+            (name, data, time.time()),
+        )
+        conn.execute('DELETE FROM chunks WHERE name = ?', (name,))
+
+    def append(self, name: str, data: bytes) -> None:
+        # NOTE: Importing is slow, do it on demand.
+        import time
+
+        self._connect(create=True).execute(
+            'INSERT INTO chunks (name, data, mtime) VALUES (?, ?, ?)',
+            (name, data, time.time()),
+        )
+
+    def remove(self, name: str) -> None:
+        conn = self._connect()
+        removed = conn.execute('DELETE FROM blobs WHERE name = ?', (name,)).rowcount
+        removed += conn.execute('DELETE FROM chunks WHERE name = ?', (name,)).rowcount
+        if not removed:
+            raise FileNotFoundError(f'No such blob: {name!r}')
+
+    def mtime(self, name: str) -> float:
+        row = (
+            self._connect()
+            .execute(
+                'SELECT max(mtime) FROM (SELECT mtime FROM blobs WHERE name = ? '
+                'UNION ALL SELECT mtime FROM chunks WHERE name = ?)',
+                (name, name),
+            )
+            .fetchone()
+        )
+        if row[0] is None:
+            raise FileNotFoundError(f'No such blob: {name!r}')
+        return row[0]
+
+    def entries(self) -> Iterator[bytes]:
+        for (data,) in self._connect().execute('SELECT data FROM entries'):
+            yield data
+
+    def write_entry(self, name: str, data: bytes) -> None:
+        self._connect(create=True).execute(
+            'INSERT OR REPLACE INTO entries (name, data) VALUES (?, ?)', (name, data)
+        )
+
+    def remove_entry(self, name: str) -> None:
+        self._connect().execute('DELETE FROM entries WHERE name = ?', (name,))
+
+    def clear_entries(self) -> None:
+        self._connect(create=True).execute('DELETE FROM entries')
+
+    def transaction(self) -> ContextManager:
+        # Connection object of sqlite3 commits the transaction when exiting
+        # "with" block, or rolls back when exception occurs.
+        return self._connect(create=True)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+#: Available storage backends of PDict.
+BACKENDS: dict[str, type[Backend]] = {
+    'pickle': FileBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
 # FIXME: PDict is buggy
 class PDict(MutableMapping[K, V]):
-    """A persistent dict with event handlers."""
+    """
+    A persistent dict with event handlers.
+
+    The dict itself is persisted as a base snapshot plus an append-only
+    journal of put/purge records, so that a dump only costs I/O of changed
+    items. The journal is compacted into snapshot when it grows larger than
+    the snapshot.
+
+    Every snapshot has a random generation, the journal starts with the
+    generation of snapshot it applies to, so a journal left by an
+    interrupted compaction is never replayed on the new snapshot.
+
+    If the backend stores entries (see :attr:`Backend.ENTRIES`), there is no
+    snapshot or journal. Every item has an entry summarized by
+    :meth:`summarize`, and the in-memory state is rebuilt from entries by
+    :meth:`post_load`, so a dump only writes entries of changed items.
+    """
+
+    #: Version of on-disk format, subclass should bump it when making
+    #: incompatible changes.
+    VERSION = 3
+    #: Journal smaller than it never triggers compaction.
+    MIN_COMPACT_SIZE = 1 << 20
+    #: Suffix of item names, subclass should change it when overriding
+    #: :meth:`serialize`.
+    ITEM_SUFFIX = '.pickle'
 
     dirname: str
+    version: int
+    generation: str
+    # Where the items and the dict itself are stored
+    _backend: Backend
     # The real in memory store of values
     _store: dict[K, V | None]
     # Items that need write back to store
     _dirty_items: dict[K, V]
     # Items that need purge from store
     _orphan_items: dict[K, V]
+    # Sizes of snapshot and journal on disk, used to decide when to compact
+    _snapshot_size: int
+    _journal_size: int
+    # Whether the journal ends with a partially written record, new records
+    # must not be appended after it
+    _journal_torn: bool
 
-    def __init__(self, dirname: str) -> None:
+    def __init__(self, dirname: str, backend: str = 'pickle') -> None:
         self.dirname = dirname
+        self.version = self.VERSION
+        self.generation = ''
+        self._backend = BACKENDS[backend](dirname)
         self._store = {}
         self._dirty_items = {}
         self._orphan_items = {}
+        self._snapshot_size = 0
+        self._journal_size = 0
+        self._journal_torn = False
 
     def __getitem__(self, key: K) -> V:
         if key not in self._store:
@@ -45,10 +340,11 @@ class PDict(MutableMapping[K, V]):
         if value is not None:
             return value
         # V haven't loaded yet, load it from disk
-        with open(self.itemfile(key), 'rb') as f:
-            value = pickle.load(f)
-            self._store[key] = value
-            return value
+        with stats.timer('item_io'):
+            data = self._backend.read(self.itemname(key))
+        value = self.deserialize(key, data)
+        self._store[key] = value
+        return value
 
     def __setitem__(self, key: K, value: V) -> None:
         assert value is not None
@@ -75,10 +371,84 @@ class PDict(MutableMapping[K, V]):
         # No used
         return key
 
+    def __getstate__(self) -> dict:
+        # Backend may hold unpicklable resource (such as database connection)
+        state = self.__dict__.copy()
+        del state['_backend']
+        del state['_snapshot_size']
+        del state['_journal_size']
+        del state['_journal_torn']
+        return state
+
     def load(self) -> None:
-        with open(self.dictfile(), 'rb') as f:
-            obj = pickle.load(f)
-            self.__dict__.update(obj.__dict__)
+        """Load the snapshot and replay the journal."""
+        if self._backend.ENTRIES:
+            self._load_entries()
+            return
+
+        data = self._backend.read(self.dictname())
+        obj = pickle.loads(data)
+        if getattr(obj, 'version', None) != self.VERSION:
+            raise ValueError(
+                f'incompatible version {getattr(obj, "version", None)} of '
+                f'{self.dictname()}, expected {self.VERSION}'
+            )
+        self.__dict__.update(obj.__dict__)
+        self._snapshot_size = len(data)
+
+        try:
+            journal = self._backend.read(self.journalname())
+        except FileNotFoundError:
+            journal = b''
+        f = io.BytesIO(journal)
+        try:
+            op, generation, _ = pickle.load(f)
+        except Exception:
+            op = generation = None
+        self._journal_torn = False
+        if op != 'generation' or generation != self.generation:
+            # Journal of other snapshot, it has been compacted into snapshot
+            # or is outdated
+            self._journal_size = 0
+            return
+        # End of the last complete record
+        self._journal_size = f.tell()
+        while f.tell() < len(journal):
+            try:
+                op, key, data = pickle.load(f)
+            except Exception:
+                # The last record may be partially written, skip it. Records
+                # appended after it would never be replayed, so the journal is
+                # compacted on the next dump, see _dump()
+                self._journal_torn = True
+                break
+            self._journal_size = f.tell()
+            value = self.deserialize(key, data)
+            if op == 'purge':
+                self._purge(key, value, write=False)
+            else:
+                self._put(key, value, write=False)
+
+    def _load_entries(self) -> None:
+        """Like :meth:`load`, but load entries."""
+        data = self._backend.read(self.dictname())
+        try:
+            version = pickle.loads(data)
+        except Exception:
+            version = None  # Written in other format
+        if version != self.VERSION:
+            raise ValueError(
+                f'incompatible version of {self.dictname()}, expected {self.VERSION}'
+            )
+        self._store, self._dirty_items, self._orphan_items = {}, {}, {}
+        self.post_clear()
+        for entry in self._backend.entries():
+            key, summary = pickle.loads(entry)
+            self._store[key] = None
+            self.post_load(key, summary)
+        self._snapshot_size = len(data)
+        self._journal_size = 0
+        self._journal_torn = False
 
     def dump(self):
         """Dump store to disk."""
@@ -89,9 +459,92 @@ class PDict(MutableMapping[K, V]):
         except ImportError:
             from sphinx.util import status_iterator
 
-        # Makesure dir exists
+        # Multiple processes (for example, builds of different projects)
+        # may share the same store, serialize their writes.
+        with stats.timer('dump'), self._lock():
+            with self._backend.transaction():
+                with stats.timer('merge'):
+                    self._merge()
+                changed = self._dump(status_iterator)
+            # Derived files must not refer to the uncommitted data
+            self.post_commit(changed)
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        """Hold an exclusive lock of store among processes."""
+        try:
+            import fcntl
+        except ImportError:
+            # Platform does not support fcntl, such as Windows
+            yield
+            return
+
         if not path.exists(self.dirname):
             os.makedirs(self.dirname)
+        with open(path.join(self.dirname, 'lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _merge(self) -> None:
+        """
+        Merge the latest store on disk, which may be changed by other
+        processes since we loaded it. Our pending changes are kept.
+        """
+        dirty_items, orphan_items = self._dirty_items, self._orphan_items
+        self._dirty_items, self._orphan_items = {}, {}
+        try:
+            self.load()
+        except (OSError, ValueError):
+            # Nothing to merge, our store will overwrite it
+            self._dirty_items, self._orphan_items = dirty_items, orphan_items
+            self._snapshot_size = self._journal_size = 0
+            self._journal_torn = False
+            return
+        self._dirty_items = dirty_items
+
+        for key in orphan_items.keys() | dirty_items.keys():
+            # Purge the latest value rather than the one we loaded, and skip
+            # items that have already been purged.
+            if key in self._store:
+                self._orphan_items[key] = self[key]
+        for key, value in dirty_items.items():
+            self._store[key] = value
+
+    def _put(self, key: K, value: V, write: bool = True) -> bytes:
+        data = self.serialize(key, value)
+        if write:
+            with stats.timer('item_io'):
+                self._backend.write(self.itemname(key), data)
+                if self._backend.ENTRIES:
+                    entry = pickle.dumps((key, self.summarize(key, value)))
+                    self._backend.write_entry(self.itemname(key), entry)
+        self._store[key] = None
+        self.post_dump(key, value)
+        return data
+
+    def _purge(self, key: K, value: V, write: bool = True) -> None:
+        if write:
+            with stats.timer('item_io'):
+                self._backend.remove(self.itemname(key))
+                if self._backend.ENTRIES:
+                    self._backend.remove_entry(self.itemname(key))
+        self._store.pop(key, None)
+        self.post_purge(key, value)
+
+    def _dump(self, status_iterator) -> bool:
+        """Dump changes, return whether anything is written."""
+        journal = bytearray()
+        entries = self._backend.ENTRIES
+        if entries and not self._snapshot_size:
+            # Entries on disk are missing or incompatible, rewrite all
+            self._backend.clear_entries()
+            for key in self._store:
+                if key not in self._dirty_items:
+                    self._dirty_items[key] = self[key]
+        changed = bool(self._orphan_items or self._dirty_items)
 
         # Purge orphan items
         for key, value in status_iterator(
@@ -102,8 +555,13 @@ class PDict(MutableMapping[K, V]):
             0,
             stringify_func=lambda i: self.stringify(i[0], i[1]),
         ):
-            os.remove(self.itemfile(key))
-            self.post_purge(key, value)
+            if not entries:
+                # Values are recorded in serialized form, so that replaying
+                # journal is never more demanding than loading items.
+                # Serialize before purging, the hooks may update state.
+                data = self.serialize(key, value)
+                journal.extend(pickle.dumps(('purge', key, data)))
+            self._purge(key, value)
 
         # Dump dirty items
         for key, value in status_iterator(
@@ -114,26 +572,81 @@ class PDict(MutableMapping[K, V]):
             0,
             stringify_func=lambda i: self.stringify(i[0], i[1]),
         ):
-            with open(self.itemfile(key), 'wb') as f:
-                pickle.dump(value, f)
-            self.post_dump(key, value)
+            data = self._put(key, value)
+            if not entries:
+                journal.extend(pickle.dumps(('put', key, data)))
 
         # Clear all in-memory items
         self._orphan_items = {}
         self._dirty_items = {}
         self._store = {key: None for key in self._store}
 
-        # Dump store itself
-        with open(self.dictfile(), 'wb') as f:
-            pickle.dump(self, f)
+        if entries:
+            if self._snapshot_size:
+                return changed
+            data = pickle.dumps(self.VERSION)
+            with stats.timer('dict_io'):
+                self._backend.write(self.dictname(), data)
+                # Left by the format without entries
+                with suppress(FileNotFoundError):
+                    self._backend.remove(self.journalname())
+            self._snapshot_size = len(data)
+            return True
 
-    def dictfile(self) -> str:
-        return path.join(self.dirname, 'dict.pickle')
+        if not journal and self._snapshot_size:
+            return False  # Nothing changed
 
-    def itemfile(self, key: K) -> str:
+        if (
+            self._snapshot_size
+            and not self._journal_torn
+            and self._journal_size + len(journal)
+            < max(self._snapshot_size, self.MIN_COMPACT_SIZE)
+        ):
+            # Record changes to journal
+            if not self._journal_size:
+                # Overwrite journal of other snapshot if exists
+                header = pickle.dumps(('generation', self.generation, b''))
+                journal[0:0] = header
+                with stats.timer('dict_io'):
+                    self._backend.write(self.journalname(), bytes(journal))
+            else:
+                with stats.timer('dict_io'):
+                    self._backend.append(self.journalname(), bytes(journal))
+            self._journal_size += len(journal)
+            return True
+
+        # Compact journal into snapshot
+        self.generation = os.urandom(8).hex()
+        with stats.timer('dict_io'):
+            data = pickle.dumps(self)
+            self._backend.write(self.dictname(), data)
+            with suppress(FileNotFoundError):
+                self._backend.remove(self.journalname())
+        self._snapshot_size = len(data)
+        self._journal_size = 0
+        self._journal_torn = False
+        return True
+
+    def dictname(self) -> str:
+        return 'dict.pickle'
+
+    def journalname(self) -> str:
+        return 'dict.journal'
+
+    def itemname(self, key: K) -> str:
         hasher = sha1()
         hasher.update(pickle.dumps(key))
-        return path.join(self.dirname, hasher.hexdigest()[:7] + '.pickle')
+        return hasher.hexdigest()[:7] + self.ITEM_SUFFIX
+
+    def itemmtime(self, key: K) -> float:
+        """Return the time when item is last dumped."""
+        return self._backend.mtime(self.itemname(key))
+
+    def serialize(self, key: K, value: V) -> bytes:
+        return pickle.dumps(value)
+
+    def deserialize(self, key: K, data: bytes) -> V:
+        return pickle.loads(data)
 
     def post_dump(self, key: K, value: V) -> None:
         pass
@@ -141,5 +654,30 @@ class PDict(MutableMapping[K, V]):
     def post_purge(self, key: K, value: V) -> None:
         pass
 
+    def summarize(self, key: K, value: V) -> Any:
+        """
+        Return the entry of item, from which :meth:`post_load` rebuilds the
+        in-memory state of item without loading it. Only used when the
+        backend stores entries.
+        """
+        return None
+
+    def post_clear(self) -> None:
+        """
+        Called when the store is cleared before loading entries, subclass
+        should clear the state derived from items.
+        """
+
+    def post_load(self, key: K, summary: Any) -> None:
+        """Like :meth:`post_dump`, but called with the loaded entry of item."""
+
+    def post_commit(self, changed: bool) -> None:
+        """
+        Called after all changes are dumped and committed, the store is still
+        locked.
+
+        :param changed: Whether anything is changed by this dump.
+        """
+
     def stringify(self, key: K, value: V) -> str:
         return str(key)
@@ -0,0 +1,78 @@
+"""
+sphinxnotes.utils.stats
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Cumulative timers and counters of build stages.
+
+:copyright: Copyright 2024 Shengyu Zhang
+:license: BSD, see LICENSE for details.
+"""
+
+from __future__ import annotations
+from typing import Any, Iterator
+from contextlib import contextmanager
+import time
+
+
+class Stats(object):
+    """Wall time, CPU time and number of calls of stages, and counters."""
+
+    #: Stage -> [wall time, CPU time, number of calls]
+    timers: dict[str, list[float]]
+    counters: dict[str, int]
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.timers = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Measure the code in context as a call of stage."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            t = self.timers.setdefault(stage, [0.0, 0.0, 0])
+            t[0] += time.perf_counter() - wall
+            t[1] += time.process_time() - cpu
+            t[2] += 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a JSON serializable copy of stats."""
+        return {
+            'timers': {
+                stage: {'wall': wall, 'cpu': cpu, 'calls': calls}
+                for stage, (wall, cpu, calls) in self.timers.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def merge(self, snapshot: dict[str, Any]) -> None:
+        """Add stats of a snapshot, which is usually taken in other process."""
+        for stage, t in snapshot['timers'].items():
+            mine = self.timers.setdefault(stage, [0.0, 0.0, 0])
+            mine[0] += t['wall']
+            mine[1] += t['cpu']
+            mine[2] += t['calls']
+        for name, n in snapshot['counters'].items():
+            self.count(name, n)
+
+    def summary(self) -> list[str]:
+        """Return human readable lines of stats."""
+        lines = [
+            f'{stage}: {wall:.3f}s wall, {cpu:.3f}s cpu, {calls} call(s)'
+            for stage, (wall, cpu, calls) in self.timers.items()
+        ]
+        if self.counters:
+            lines.append(', '.join(f'{k}: {v}' for k, v in self.counters.items()))
+        return lines
+
+
+#: Stats of current process.
+stats = Stats()
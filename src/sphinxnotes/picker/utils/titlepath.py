@@ -59,3 +59,43 @@ def resolve_document(env: BuildEnvironment, docname: str) -> list[nodes.title]:
         titles.append(env.titles[master_doc])
 
     return titles
+
+
+def resolve_document_text(
+    env: BuildEnvironment, docname: str, memo: dict[str, list[str]]
+) -> list[str]:
+    """
+    Like :func:`resolve_document`, but return texts of titles.
+
+    Titles only depend on the directory of document, so they are memoized in
+    ``memo`` by directory and shared by documents in the same directory. The
+    memo is valid as long as ``env.titles`` is unchanged.
+    """
+    master_doc = env.config.master_doc
+    v = docname.split('/')
+    # Exclude self, see resolve_document()
+    if v.pop() == master_doc and v:
+        v.pop()
+    return _resolve_directory_text(env, '/'.join(v), memo)
+
+
+def _resolve_directory_text(
+    env: BuildEnvironment, dirname: str, memo: dict[str, list[str]]
+) -> list[str]:
+    if (titles := memo.get(dirname)) is not None:
+        return titles
+
+    master_doc = env.config.master_doc
+    if not dirname:
+        # Title of top-level master doc
+        titles = [env.titles[master_doc].astext()] if master_doc in env.titles else []
+    else:
+        master_docname = dirname + '/' + master_doc
+        if master_docname in env.titles:
+            title = env.titles[master_docname].astext()
+        else:
+            title = dirname.rsplit('/', 1)[-1].title()  # FIXME: Mock title for now
+        parent = dirname.rsplit('/', 1)[0] if '/' in dirname else ''
+        titles = [title, *_resolve_directory_text(env, parent, memo)]
+    memo[dirname] = titles
+    return titles
@@ -0,0 +1,30 @@
+"""Helpers shared by test modules."""
+
+from __future__ import annotations
+
+from sphinxnotes.picker.cache import Item, Record
+
+
+def make_item(
+    docname: str,
+    title: str,
+    titlepath: list[str] | None = None,
+    keywords: list[str] | None = None,
+) -> Item:
+    """Return a section item, keywords default to the lowercased title."""
+    return Item(
+        snippet=Record(
+            kind='section',
+            docname=docname,
+            file=f'/src/{docname}.rst',
+            lineno=(1, 2),
+            source=[title],
+            text=[title],
+            refid=title.lower(),
+            title=title,
+        ),
+        tags='s',
+        excerpt=f'[{title}]',
+        titlepath=[] if titlepath is None else titlepath,
+        keywords=[title.lower()] if keywords is None else keywords,
+    )
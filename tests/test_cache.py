@@ -0,0 +1,169 @@
+import unittest
+import tempfile
+import itertools
+from unittest import mock
+
+from sphinxnotes.picker.cache import Cache
+from sphinxnotes.picker.utils.pdict import BACKENDS
+
+from tests.helpers import make_item
+
+
+DOCS = {
+    ('proj', f'doc{i}'): [make_item(f'doc{i}', f'Title {j}') for j in range(5)]
+    for i in range(6)
+}
+
+
+class NarrowCache(Cache):
+    # Make collisions of ID prefix common
+    ID_WIDTH = 1
+
+
+class TestIndexID(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def new_cache(self, cls=NarrowCache) -> Cache:
+        return cls(self.tmpdir.name)
+
+    def check_consistent(self, cache: Cache) -> None:
+        ids = [id for ids in cache.doc_id_to_index_ids.values() for id in ids]
+        self.assertEqual(sorted(ids), sorted(cache.indexes))
+        self.assertEqual(sorted(ids), sorted(cache.index_id_to_doc_id))
+        for doc_id, ids in cache.doc_id_to_index_ids.items():
+            for i, index_id in enumerate(ids):
+                self.assertEqual(cache.index_id_to_doc_id[index_id], (doc_id, i))
+        for index_id in ids:
+            others = [id for id in ids if id != index_id]
+            self.assertFalse(any(id.startswith(index_id) for id in others))
+
+    def test_stable(self):
+        cache = self.new_cache(Cache)
+        for key, doc in DOCS.items():
+            cache.post_dump(key, doc)
+        ids = dict(cache.doc_id_to_index_ids)
+        self.assertTrue(all(len(id) == 7 for id in cache.indexes))
+
+        cache = self.new_cache(Cache)
+        for key, doc in reversed(DOCS.items()):
+            cache.post_dump(key, doc)
+        self.assertEqual(cache.doc_id_to_index_ids, ids)
+
+    def test_independent_of_order(self):
+        expected = None
+        for keys in itertools.islice(itertools.permutations(DOCS), 0, None, 97):
+            cache = self.new_cache()
+            for key in keys:
+                cache.post_dump(key, DOCS[key])
+            self.check_consistent(cache)
+            ids = {k: cache.doc_id_to_index_ids[k] for k in DOCS}
+            if expected is None:
+                expected = ids
+            self.assertEqual(ids, expected)
+
+    def test_purge_and_update(self):
+        keys = list(DOCS)
+        cache = self.new_cache()
+        for key in keys:
+            cache.post_dump(key, DOCS[key])
+        cache.post_purge(keys[0], DOCS[keys[0]])
+        cache.post_purge(keys[1], DOCS[keys[1]])
+        cache.post_dump(keys[1], DOCS[keys[1]][:2])
+        # Overwrite without purging, as replaying journal may do
+        cache.post_dump(keys[2], DOCS[keys[2]][:3])
+        self.check_consistent(cache)
+
+        fresh = self.new_cache()
+        fresh.post_dump(keys[1], DOCS[keys[1]][:2])
+        fresh.post_dump(keys[2], DOCS[keys[2]][:3])
+        for key in keys[3:]:
+            fresh.post_dump(key, DOCS[key])
+        self.assertEqual(cache.doc_id_to_index_ids, fresh.doc_id_to_index_ids)
+        self.assertEqual(cache.indexes, fresh.indexes)
+        self.assertEqual(cache.digest_groups, fresh.digest_groups)
+
+
+class TestDumpLoad(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def state(self, cache: Cache) -> dict:
+        return {
+            k: getattr(cache, k)
+            for k in [
+                'indexes',
+                'index_id_to_doc_id',
+                'doc_id_to_index_ids',
+                'num_snippets_by_project',
+                'num_snippets_by_docid',
+                'doc_id_to_spans',
+                'digest_groups',
+            ]
+        }
+
+    def test_dump_load(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                dirname = f'{self.tmpdir.name}/{backend}'
+                keys = list(DOCS)
+                cache = NarrowCache(dirname, backend)
+                for key in keys[:4]:
+                    cache[key] = DOCS[key]
+                cache.dump()
+                # Changed in a later build
+                del cache[keys[0]]
+                cache[keys[1]] = DOCS[keys[1]][:2]
+                cache[keys[4]] = DOCS[keys[4]]
+                cache.dump()
+
+                loaded = NarrowCache(dirname, backend)
+                loaded.load()
+                self.assertEqual(self.state(loaded), self.state(cache))
+                self.assertEqual(sorted(loaded), sorted(keys[1:5]))
+                for index_id, (doc_id, i) in loaded.index_id_to_doc_id.items():
+                    item = loaded.load_item(loaded.location(index_id))
+                    self.assertEqual(item, DOCS[doc_id][i])
+                name, offset, length, checksum = loaded.location(index_id)
+                with self.assertRaises(ValueError):
+                    loaded.load_item((name, offset, length, checksum + 1))
+
+    def test_entries(self):
+        # A dump only writes entries of changed documents
+        cache = Cache(self.tmpdir.name, 'sqlite')
+        for key, doc in DOCS.items():
+            cache[key] = doc
+        cache.dump()
+        written = []
+        write_entry = cache._backend.write_entry
+        with mock.patch.object(
+            cache._backend,
+            'write_entry',
+            lambda name, data: written.append(name) or write_entry(name, data),
+        ):
+            key = next(iter(DOCS))
+            cache[key] = DOCS[key][:1]
+            cache.dump()
+        self.assertEqual(written, [cache.itemname(key)])
+
+
+class TestStatistic(unittest.TestCase):
+    def test_replayed(self):
+        cache = Cache(tempfile.gettempdir())
+        keys = list(DOCS)
+        for key in keys[:2]:
+            cache.post_dump(key, DOCS[key])
+        # Records that are already applied may be replayed
+        cache.post_dump(keys[0], DOCS[keys[0]][:1])
+        cache.post_purge(keys[1], DOCS[keys[1]])
+        cache.post_purge(keys[1], DOCS[keys[1]])
+        self.assertEqual(cache.num_snippets_by_project, {'proj': 1})
+        self.assertEqual(cache.num_snippets_by_docid, {keys[0]: 1})
+        self.assertEqual(list(cache.doc_id_to_index_ids), [keys[0]])
+        self.assertEqual(len(cache.indexes), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import unittest
+import tempfile
+import json
+import io
+import os
+import dataclasses
+import threading
+import socket
+from os import path
+from contextlib import redirect_stdout, redirect_stderr, suppress
+
+from sphinxnotes.picker import cli, server
+from sphinxnotes.picker.cache import Cache
+
+from tests.helpers import make_item
+
+
+class CLITestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.cache_dir = path.join(self.tmpdir.name, 'cache')
+        cache = Cache(self.cache_dir)
+        cache[('proj', 'doc')] = [
+            make_item('doc', 'Foo', ['Doc']),
+            make_item('doc', 'Bar', ['Doc']),
+        ]
+        cache.dump()
+        self.index_ids = cache.doc_id_to_index_ids[('proj', 'doc')]
+
+        self.config = path.join(self.tmpdir.name, 'conf.py')
+        with open(self.config, 'w') as f:
+            f.write(f'cache_dir = {self.cache_dir!r}\n')
+
+    def run_cli(self, *argv: str) -> str:
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            cli.main(['-c', self.config, '--direct', *argv])
+        return stdout.getvalue()
+
+
+class TestGet(CLITestCase):
+    def get_json(self, *argv: str) -> dict:
+        return json.loads(self.run_cli('get', '--json', *argv, self.index_ids[0]))
+
+    def test_json(self):
+        obj = self.get_json()
+        self.assertEqual(obj['id'], self.index_ids[0])
+        self.assertEqual(obj['title'], 'Foo')
+        self.assertEqual(obj['titlepath'], ['Doc'])
+        self.assertEqual(obj['keywords'], ['foo'])
+
+    def test_json_selected(self):
+        self.assertEqual(
+            self.get_json('--title', '--docname'),
+            {'id': self.index_ids[0], 'title': 'Foo', 'docname': 'doc'},
+        )
+
+    def test_json_all(self):
+        # --all is not a selection, nothing is filtered out
+        self.assertEqual(self.get_json('--all'), self.get_json())
+        self.assertEqual(self.get_json('--all', '--title'), self.get_json())
+
+    def test_stale_indexfile(self):
+        cache = Cache(self.cache_dir)
+        cache.load()
+        indexfile = cache.indexfile()
+        with open(indexfile, 'rb') as f:
+            stale = f.read()
+        changed = dataclasses.replace(make_item('doc', 'Foo'), keywords=['changed'])
+        cache[('proj', 'doc')] = [changed, make_item('doc', 'Bar')]
+        cache.dump()
+        # Locations in the outdated index file point to the changed item file
+        with open(indexfile, 'wb') as f:
+            f.write(stale)
+        self.assertEqual(self.get_json()['keywords'], ['changed'])
+
+
+class TestServer(CLITestCase):
+    def test_rejected(self):
+        sock = server.listen(server.socket_path(self.cache_dir))
+
+        def run():
+            # Serving stops when socket is shut down
+            with suppress(OSError):
+                server.serve(sock, lambda _: {'rejected': True})
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(sock.shutdown, socket.SHUT_RDWR)
+        # Rejected request is handled directly
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            cli.main(['-c', self.config, 'get', '--title', self.index_ids[0]])
+        self.assertEqual(stdout.getvalue(), 'Foo\n')
+
+
+class TestList(CLITestCase):
+    def rendered(self) -> list[str]:
+        renderdir = Cache(self.cache_dir).renderdir()
+        return [
+            path.join(root, fn) for root, _, files in os.walk(renderdir) for fn in files
+        ]
+
+    def test_rendered(self):
+        output = self.run_cli('list', '--width', '80')
+        self.assertIn('Foo', output)
+        rendered = self.rendered()
+        self.assertEqual(len(rendered), 1)
+
+        # Later calls copy the kept output
+        with open(rendered[0], 'w') as f:
+            f.write('kept')
+        self.assertEqual(self.run_cli('list', '--width', '80'), 'kept')
+        self.assertEqual(self.run_cli('list', '--width', '80', '--tags', 's'), output)
+        self.assertNotEqual(self.run_cli('list', '--width', '100'), 'kept')
+        self.assertNotIn('kept', self.run_cli('list', '--query', 'foo'))
+        self.assertEqual(len(self.rendered()), 3)
+
+        # Outputs are removed when cache is dumped
+        cache = Cache(self.cache_dir)
+        cache.load()
+        cache[('proj', 'new')] = [make_item('new', 'Baz')]
+        cache.dump()
+        self.assertEqual(self.rendered(), [])
+        self.assertIn('Baz', self.run_cli('list', '--width', '80'))
+
+    def test_rendered_frecency(self):
+        def listed() -> list[str]:
+            output = self.run_cli('list', '--width', '80', '--sort', 'frecency')
+            return [line.split()[0] for line in output.splitlines()[1:]]
+
+        self.assertEqual(listed(), self.index_ids)
+        self.assertEqual(len(self.rendered()), 1)
+        self.assertEqual(listed(), self.index_ids)
+
+        # Only selections made by user are recorded
+        self.run_cli('get', '--title', self.index_ids[1])
+        self.assertEqual(listed(), self.index_ids)
+
+        # Selection changes the order, the kept output is outdated
+        self.run_cli('get', '--record', '--title', self.index_ids[1])
+        self.assertEqual(self.rendered(), [])
+        self.assertEqual(listed(), self.index_ids[::-1])
+        self.assertEqual(len(self.rendered()), 1)
+
+        # Selection keeps the order, so does the kept output
+        self.run_cli('get', '--record', '--json', self.index_ids[1])
+        self.assertEqual(len(self.rendered()), 1)
+        self.assertEqual(listed(), self.index_ids[::-1])
+
+
+class TestExportPreviews(CLITestCase):
+    def test_export_previews(self):
+        previewdir = self.run_cli('export-previews').strip()
+        self.assertEqual(previewdir, Cache(self.cache_dir).previewdir())
+        with open(path.join(previewdir, f'{self.index_ids[0]}.src')) as f:
+            self.assertEqual(f.read(), 'Foo\n')
+
+    def test_outdated(self):
+        # Dumps don't export previews
+        previewdir = Cache(self.cache_dir).previewdir()
+        self.assertFalse(path.exists(previewdir))
+
+        self.run_cli('export-previews')
+        src = path.join(previewdir, f'{self.index_ids[1]}.src')
+        with open(src, 'w') as f:
+            f.write('kept')
+        self.run_cli('export-previews')
+        with open(src) as f:
+            self.assertEqual(f.read(), 'kept')
+
+        # Touching item file doesn't outdate previews
+        cache = Cache(self.cache_dir)
+        itemfile = path.join(self.cache_dir, cache.itemname(('proj', 'doc')))
+        os.utime(itemfile, (0, 0))
+        self.run_cli('export-previews')
+        with open(src) as f:
+            self.assertEqual(f.read(), 'kept')
+
+        # Document is exported again once its content changes
+        cache = Cache(self.cache_dir)
+        cache.load()
+        changed = dataclasses.replace(make_item('doc', 'Bar'), keywords=['changed'])
+        cache[('proj', 'doc')] = [make_item('doc', 'Foo'), changed]
+        cache.dump()
+        self.run_cli('export-previews')
+        with open(src) as f:
+            self.assertEqual(f.read(), 'Bar\n')
+        self.assertEqual(
+            sorted(os.listdir(previewdir)),
+            sorted(
+                ['manifest.json']
+                + [f'{i}.{ext}' for i in self.index_ids for ext in ['src', 'text']]
+            ),
+        )
+
+    def test_empty_cache(self):
+        with open(self.config, 'w') as f:
+            f.write(f'cache_dir = {path.join(self.tmpdir.name, "empty")!r}\n')
+        with redirect_stderr(io.StringIO()):
+            previewdir = self.run_cli('export-previews').strip()
+        self.assertEqual(previewdir, path.join(self.tmpdir.name, 'empty', 'previews'))
+
+
+if __name__ == '__main__':
+    unittest.main()
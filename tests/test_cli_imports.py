@@ -0,0 +1,67 @@
+import unittest
+import tempfile
+import subprocess
+import sys
+import os
+import json
+from os import path
+
+from sphinxnotes.picker.cache import Cache
+
+from tests.helpers import make_item
+
+
+# Run CLI commands in a fresh interpreter, then print the heavy packages that
+# have been imported
+SCRIPT = """
+import sys
+import json
+from sphinxnotes.picker import cli
+for argv in json.loads(sys.argv[1]):
+    cli.main(argv)
+heavy = ('docutils', 'pygments', 'sphinx')
+print(sorted(m for m in sys.modules if m.split('.')[0] in heavy), file=sys.stderr)
+"""
+
+
+class TestImports(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        cache_dir = path.join(self.tmpdir.name, 'cache')
+        cache = Cache(cache_dir)
+        cache[('proj', 'doc')] = [make_item('doc', 'Foo'), make_item('doc', 'Bar')]
+        cache.dump()
+        self.index_id = cache.doc_id_to_index_ids[('proj', 'doc')][0]
+
+        self.config = path.join(self.tmpdir.name, 'conf.py')
+        with open(self.config, 'w') as f:
+            f.write(f'cache_dir = {cache_dir!r}\n')
+
+    def run_cli(self, *commands: list[str]) -> subprocess.CompletedProcess:
+        argvs = [['-c', self.config, '--direct', *cmd] for cmd in commands]
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        return subprocess.run(
+            [sys.executable, '-c', SCRIPT, json.dumps(argvs)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    def test_list_and_get(self):
+        proc = self.run_cli(
+            ['list'],
+            ['list', '--tags', 's', '--docname', 'd*'],
+            ['get', '--all', self.index_id],
+            ['get', '--json', self.index_id],
+        )
+        self.assertIn('Foo', proc.stdout)
+        self.assertIn('Bar', proc.stdout)
+        obj = json.loads(proc.stdout.splitlines()[-1])
+        self.assertEqual(obj['id'], self.index_id)
+        self.assertEqual(proc.stderr.splitlines()[-1], '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import random
+
+from wcwidth import wcswidth
+
+from sphinxnotes.picker.utils.ellipsis import widths, str_width, ellipsis, join
+
+
+def reference_ellipsis(text, width, ellipsis_sym='..', blank_sym=None):
+    """The previous implementation that measures the whole string by wcswidth."""
+    text_width = wcswidth(text)
+    if text_width <= width:
+        if blank_sym:
+            text += blank_sym * ((width - text_width) // wcswidth(blank_sym))
+        return text
+    width -= wcswidth(ellipsis_sym)
+    if width > text_width:
+        width = text_width
+    i = 0
+    new_text = ''
+    while wcswidth(new_text) < width:
+        new_text += text[i]
+        i += 1
+    return new_text + ellipsis_sym
+
+
+def reference_join(
+    lst, total_width, title_width, separate_sym='/', ellipsis_sym='..', blank_sym=None
+):
+    total_width -= wcswidth(ellipsis_sym)
+    result = []
+    for i, ln in enumerate(lst):
+        ln = reference_ellipsis(ln, title_width, ellipsis_sym=ellipsis_sym)
+        l_width = wcswidth(ln) + (wcswidth(separate_sym) if i != 0 else 0)
+        if total_width - l_width < 0:
+            break
+        result.append(ln)
+        total_width -= l_width
+    s = separate_sym.join(result)
+    if blank_sym:
+        s += blank_sym * (total_width // wcswidth(blank_sym))
+    return s
+
+
+ALPHABET = [
+    'a',
+    'Z',
+    ' ',
+    '中',
+    '文',
+    'é',
+    'é',  # Combining acute accent
+    '😀',
+    '❤️',  # VS16
+    '👨‍👩‍👧',  # ZWJ sequence
+]
+
+
+def gen_texts(num: int) -> list[str]:
+    rand = random.Random(42)
+    return [''.join(rand.choices(ALPHABET, k=rand.randint(0, 12))) for _ in range(num)]
+
+
+class TestWidth(unittest.TestCase):
+    def test_str_width(self):
+        for text in gen_texts(500) + ALPHABET:
+            with self.subTest(text=text):
+                self.assertEqual(str_width(text), wcswidth(text))
+                self.assertEqual(sum(widths(text)), wcswidth(text))
+
+    def test_control(self):
+        # Control characters are 0 width rather than making width -1
+        self.assertEqual(str_width('a\x1bb'), 2)
+        self.assertEqual(ellipsis('a\x1bbcd', 4), 'a\x1bbcd')
+        self.assertEqual(ellipsis('a\x1bbcd', 3), 'a..')
+
+
+class TestEllipsis(unittest.TestCase):
+    def test_ellipsis(self):
+        for text in gen_texts(500):
+            for width in range(14):
+                for blank_sym in [None, ' ']:
+                    with self.subTest(text=text, width=width, blank_sym=blank_sym):
+                        self.assertEqual(
+                            ellipsis(text, width, blank_sym=blank_sym),
+                            reference_ellipsis(text, width, blank_sym=blank_sym),
+                        )
+
+    def test_join(self):
+        texts = gen_texts(300)
+        for i in range(0, len(texts), 3):
+            lst = texts[i : i + 3]
+            for total_width in [0, 5, 12, 30]:
+                with self.subTest(lst=lst, total_width=total_width):
+                    self.assertEqual(
+                        join(lst, total_width, 6, blank_sym=' '),
+                        reference_join(lst, total_width, 6, blank_sym=' '),
+                    )
+
+
+if __name__ == '__main__':
+    unittest.main()
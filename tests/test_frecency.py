@@ -0,0 +1,75 @@
+import unittest
+import tempfile
+import time
+from os import path
+from unittest import mock
+
+from sphinxnotes.picker import frecency
+from sphinxnotes.picker.frecency import Frecency, HALF_LIFE, DEDUP_INTERVAL
+
+
+class TestFrecency(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.store = Frecency(self.tmpdir.name)
+
+    def test_score(self):
+        store = self.store
+        self.assertEqual(store.score('a', now=0), 0)
+        store.record(['a'], now=0)
+        self.assertEqual(store.score('a', now=0), 1)
+        self.assertAlmostEqual(store.score('a', now=HALF_LIFE), 0.5)
+        store.record(['a'], now=HALF_LIFE)
+        self.assertAlmostEqual(store.score('a', now=HALF_LIFE), 1.5)
+
+    def test_dedup(self):
+        store = self.store
+        store.record(['a'], now=0)
+        store.record(['a'], now=DEDUP_INTERVAL / 2)
+        self.assertEqual(store.entries['a'][0], 1)
+        # Interval is counted from the last selection
+        store.record(['a'], now=DEDUP_INTERVAL * 1.4)
+        self.assertEqual(store.entries['a'][0], 1)
+        store.record(['a'], now=DEDUP_INTERVAL * 3)
+        self.assertGreater(store.entries['a'][0], 1.9)
+
+    def test_ranked(self):
+        store = self.store
+        for i in range(6):
+            store.record(['frequent'] + (['old'] if i < 3 else []), now=i * 100)
+        store.record(['new', 'other'], now=HALF_LIFE * 2)
+        store.record(['new'], now=HALF_LIFE * 2 + 100)
+        # Scores halve twice: frequent 1.5, old 0.75
+        expected = ['new', 'frequent', 'other', 'old']
+        self.assertEqual(store.ranked(now=HALF_LIFE * 2 + 100), expected)
+        # Order does not change with time
+        self.assertEqual(store.ranked(now=HALF_LIFE * 10), expected)
+
+    def test_dump_load(self):
+        self.store.record(['a', 'b'])
+        self.store.record(['b'], now=self.store.entries['b'][1] + DEDUP_INTERVAL)
+        self.store.dump()
+        store = Frecency(self.tmpdir.name)
+        self.assertEqual(store.entries, self.store.entries)
+        self.assertEqual(store.ranked(), ['b', 'a'])
+
+    def test_max_entries(self):
+        now = time.time()
+        for i in range(10):
+            for j in range(i + 1):
+                self.store.record([str(i)], now=now + j * DEDUP_INTERVAL)
+        with mock.patch.object(frecency, 'MAX_ENTRIES', 3):
+            self.store.dump()
+        self.assertEqual(Frecency(self.tmpdir.name).ranked(), ['9', '8', '7'])
+
+    def test_broken(self):
+        for data in ['', '{', '[]', '{"a": 1}', '{"a": [1, 2]']:
+            with self.subTest(data=data):
+                with open(path.join(self.tmpdir.name, frecency.FILENAME), 'w') as f:
+                    f.write(data)
+                self.assertEqual(Frecency(self.tmpdir.name).entries, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
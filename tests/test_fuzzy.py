@@ -0,0 +1,127 @@
+import unittest
+import tempfile
+import random
+from os import path
+
+from sphinxnotes.picker import indexfile, fuzzy
+
+
+def make_row(n: int, excerpt: str, keywords: list[str] | None = None):
+    keywords = [] if keywords is None else keywords
+    return (f'{n:07x}', ('s', excerpt, [], keywords), ('proj', f'doc{n}'))
+
+
+def gen_rows(num: int) -> list:
+    rand = random.Random(42)
+    words = [
+        'backup', 'restore', 'network', 'socket',
+        'sphinx', 'document', 'index', 'cache',
+    ]  # fmt: skip
+    syllables = ['ka', 'ri', 'to', 'mu', 'ne', 'so', 'la', 'pi']
+    rows = []
+    for n in range(num):
+        title = ' '.join(
+            rand.choices(words, k=2)
+            + [''.join(rand.choices(syllables, k=3)) for _ in range(2)]
+        )
+        rows.append(make_row(n, f'[{title}]', title.split()))
+    return rows
+
+
+class TestHaystack(unittest.TestCase):
+    def test_haystack(self):
+        index = ('s', '[Foo Bar]', ['Title'], ['foo', 'bar', 'baz'])
+        self.assertEqual(fuzzy.haystack(index), '[foo bar] title foo bar baz')
+
+    def test_charmaps(self):
+        haystacks = ['abc', 'b', '', 'c中']
+        bitmaps = fuzzy.charmaps(haystacks)
+        self.assertEqual(len(bitmaps), fuzzy.NUM_BUCKETS)
+
+        def rows(c: str) -> int:
+            return int.from_bytes(bitmaps[fuzzy.bucket(c)], 'little')
+
+        self.assertEqual(rows('a'), 0b0001)
+        self.assertEqual(rows('b'), 0b0011)
+        self.assertEqual(rows('c'), 0b1001)
+        self.assertTrue(rows('中') & 0b1000)
+        self.assertEqual(rows('z'), 0)
+
+    def test_offsets(self):
+        haystacks = ['abc', '', 'de']
+        packed = fuzzy.ROW_SEPARATOR.join(haystacks)
+        offsets = fuzzy.offsets(haystacks)
+        for n, h in enumerate(haystacks):
+            self.assertEqual(packed[offsets[n] : offsets[n + 1] - 1], h)
+
+
+class TestSearch(unittest.TestCase):
+    def search(self, rows, query, limit=10, accept=None):
+        corpus = fuzzy.MemoryCorpus(rows)
+        return [(s, row[0]) for s, row in fuzzy.search(corpus, query, limit, accept)]
+
+    def test_ranking(self):
+        rows = [
+            make_row(0, 'b-a-c-k-u-p'),  # Wide match
+            make_row(1, 'bkp'),  # Consecutive
+            make_row(2, 'xbkp'),  # Consecutive, not at boundary
+            make_row(3, 'backup'),  # Narrow match
+            make_row(4, 'nothing'),
+            make_row(5, 'a backup'),  # Same score as row 3
+        ]
+        results = self.search(rows, 'bkp')
+        self.assertEqual(
+            [id for _, id in results], [f'{n:07x}' for n in [1, 2, 3, 5, 0]]
+        )
+        scores = [s for s, _ in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(scores[2], scores[3])
+
+    def test_query(self):
+        rows = [make_row(0, 'Sphinx Doc'), make_row(1, 'a.b')]
+        self.assertEqual(len(self.search(rows, 'SPHINX doc')), 1)
+        self.assertEqual(len(self.search(rows, 'a.b')), 1)
+        self.assertEqual(len(self.search(rows, 'ab')), 1)
+        self.assertEqual(self.search(rows, 'a*b'), [])
+        self.assertEqual(self.search(rows, '  '), [])
+        self.assertEqual(self.search(rows, 'doc', limit=0), [])
+
+    def test_accept(self):
+        rows = gen_rows(200)
+
+        def odd(row) -> bool:
+            return int(row[0], 16) % 2 == 1
+
+        everything = self.search(rows, 'nesok', limit=1000)
+        self.assertEqual(
+            self.search(rows, 'nesok', limit=5, accept=odd),
+            [r for r in everything if int(r[1], 16) % 2 == 1][:5],
+        )
+
+    def test_limit(self):
+        rows = gen_rows(2000)
+        for query in ['bkp', 'netsock', 'sphinx doc', 'karito', 'xyzzy', 'ne']:
+            everything = self.search(rows, query, limit=10000)
+            for limit in [1, 3, 20]:
+                with self.subTest(query=query, limit=limit):
+                    self.assertEqual(
+                        self.search(rows, query, limit=limit), everything[:limit]
+                    )
+
+    def test_index_file(self):
+        rows = gen_rows(500)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = path.join(tmpdir, indexfile.FILENAME)
+            indexfile.dump(filename, [(*row, ('', 0, 0, 0)) for row in rows], {})
+            idxfile = indexfile.IndexFile(filename)
+            for query in ['bkp', 'netsock', 'sphinx doc', 'xyzzy']:
+                with self.subTest(query=query):
+                    self.assertEqual(
+                        [(s, row[0]) for s, row in fuzzy.search(idxfile, query, 20)],
+                        self.search(rows, query, limit=20),
+                    )
+            idxfile.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
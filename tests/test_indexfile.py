@@ -0,0 +1,82 @@
+import unittest
+import tempfile
+from os import path
+
+from sphinxnotes.picker import indexfile
+
+ROWS = [
+    ('aaa0001', ('d', '<Guide>', ['Root'], ['guide', 'setup']), ('proj', 'guide'), ('i1.jsonl', 0, 10, 1)),
+    ('bbb0002', ('s', '[Backup]', ['Guide', 'Root'], ['guide', 'backup']), ('proj', 'guide'), ('i1.jsonl', 10, 20, 2)),
+    ('ccc0003', ('c', '`sh: 备份`', [], ['net/sock', '备份']), ('other', 'net/sock'), ('i2.jsonl', 0, 5, 3)),
+]  # fmt: skip
+
+
+class TestIndexFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.filename = path.join(self.tmpdir.name, indexfile.FILENAME)
+        indexfile.dump(self.filename, reversed(ROWS), {'num_docs': 2})
+        self.idxfile = indexfile.IndexFile(self.filename)
+        self.addCleanup(self.idxfile.close)
+
+    def test_rows(self):
+        self.assertEqual(len(self.idxfile), 3)
+        rows = [(id, index, doc_id) for id, index, doc_id, _ in reversed(ROWS)]
+        self.assertEqual(list(self.idxfile), rows)
+        self.assertEqual(self.idxfile.row(2), rows[2])
+        self.assertEqual(self.idxfile.stat(), {'num_docs': 2})
+
+    def test_lookup(self):
+        for index_id, index, doc_id, loc in ROWS:
+            self.assertEqual(
+                self.idxfile.lookup(index_id), ((index_id, index, doc_id), loc)
+            )
+        self.assertIsNone(self.idxfile.lookup('aaa0000'))
+        self.assertIsNone(self.idxfile.lookup('zzz'))
+
+    def test_select(self):
+        def select(**kwargs):
+            return [row[0] for row in self.idxfile.select(**kwargs)]
+
+        self.assertEqual(select(), ['ccc0003', 'bbb0002', 'aaa0001'])
+        self.assertEqual(select(tags='ds'), ['bbb0002', 'aaa0001'])
+        self.assertEqual(select(project='other'), ['ccc0003'])
+        self.assertEqual(select(project='none'), [])
+        self.assertEqual(select(docname='net/*'), ['ccc0003'])
+        self.assertEqual(select(docname='g*', tags='c'), [])
+        self.assertEqual(select(docname='**', tags='sc', project='proj'), ['bbb0002'])
+
+    def test_postings(self):
+        self.assertEqual(self.idxfile.postings('guide'), [(1, 1), (2, 1)])
+        self.assertEqual(self.idxfile.postings('missing'), [])
+        self.assertEqual(
+            self.idxfile.total_length(), sum(self.idxfile.length(n) for n in range(3))
+        )
+
+    def test_truncated(self):
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        for size in (
+            0,
+            3,
+            indexfile._HEADER.size - 1,
+            indexfile._HEADER.size,
+            len(data) - 1,
+        ):
+            with self.subTest(size=size):
+                with open(self.filename, 'wb') as f:
+                    f.write(data[:size])
+                with self.assertRaises(ValueError):
+                    indexfile.IndexFile(self.filename)
+
+    def test_unsupported_version(self):
+        with open(self.filename, 'r+b') as f:
+            f.seek(4)
+            f.write(b'\0\0')
+        with self.assertRaises(ValueError):
+            indexfile.IndexFile(self.filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
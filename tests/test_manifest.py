@@ -0,0 +1,128 @@
+import unittest
+import tempfile
+import os
+import pickle
+import dataclasses
+from os import path
+
+from sphinxnotes.picker.manifest import Manifest
+from sphinxnotes.picker.ext import _fingerprint
+
+from tests.helpers import make_item
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.mtime = 1_000_000_000
+        self.src = self.write('doc.rst', 'Title\n=====\n')
+        self.dep = self.write('dep.txt', 'included\n')
+        self.manifest = Manifest(path.join(self.tmpdir.name, 'manifest.pickle'))
+
+    def write(self, fn: str, content: str) -> str:
+        """Write file with an increasing mtime, as the clock may be coarse."""
+        fn = path.join(self.tmpdir.name, fn)
+        with open(fn, 'w') as f:
+            f.write(content)
+        self.touch(fn)
+        return fn
+
+    def touch(self, fn: str) -> None:
+        self.mtime += 1
+        os.utime(fn, ns=(self.mtime, self.mtime))
+
+    def record(self, deps: list[str] | None = None) -> None:
+        deps = [] if deps is None else deps
+        self.manifest.record('doc', self.src, deps, 'item.jsonl', 'fingerprint')
+
+    def test_record(self):
+        self.assertTrue(self.manifest.is_outdated('doc'))
+        self.record()
+        self.assertTrue(self.manifest.dirty)
+        self.assertFalse(self.manifest.is_outdated('doc'))
+        self.assertEqual(self.manifest.entries['doc'].itemname, 'item.jsonl')
+
+        self.write('doc.rst', 'Changed\n=======\n')
+        self.assertTrue(self.manifest.is_outdated('doc'))
+        self.record()
+        os.remove(self.src)
+        self.assertTrue(self.manifest.is_outdated('doc'))
+
+    def test_touched(self):
+        self.record()
+        self.manifest.dirty = False
+        self.touch(self.src)
+        self.assertFalse(self.manifest.is_outdated('doc'))
+        # The new stat is remembered, so file is not hashed again
+        self.assertEqual(self.manifest.entries['doc'].stat[0], self.mtime)
+        self.assertTrue(self.manifest.dirty)
+
+    def test_deps(self):
+        missing = path.join(self.tmpdir.name, 'missing.txt')
+        self.record([self.dep, missing])
+        self.assertFalse(self.manifest.is_outdated('doc'))
+
+        # Dependent files are compared by stat only
+        self.touch(self.dep)
+        self.assertTrue(self.manifest.is_outdated('doc'))
+        self.record([self.dep, missing])
+        self.write('missing.txt', 'created\n')
+        self.assertTrue(self.manifest.is_outdated('doc'))
+        self.record([self.dep, missing])
+        os.remove(self.dep)
+        self.assertTrue(self.manifest.is_outdated('doc'))
+
+    def test_remove(self):
+        self.record()
+        self.manifest.dirty = False
+        self.manifest.remove('other')
+        self.assertFalse(self.manifest.dirty)
+        self.manifest.remove('doc')
+        self.assertTrue(self.manifest.dirty)
+        self.assertTrue(self.manifest.is_outdated('doc'))
+
+    def test_dump_load(self):
+        self.record([self.dep])
+        self.manifest.dump()
+        self.assertFalse(self.manifest.dirty)
+
+        manifest = Manifest(self.manifest.filename)
+        manifest.load()
+        self.assertEqual(manifest.entries, self.manifest.entries)
+        self.assertFalse(manifest.is_outdated('doc'))
+
+    def test_other_version(self):
+        self.record()
+        with open(self.manifest.filename, 'wb') as f:
+            pickle.dump((Manifest.VERSION - 1, self.manifest.entries), f)
+        manifest = Manifest(self.manifest.filename)
+        manifest.load()
+        self.assertEqual(manifest.entries, {})
+        self.assertTrue(manifest.is_outdated('doc'))
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_fingerprint(self):
+        doc = [make_item('doc', 'Foo'), make_item('doc', 'Bar')]
+        fingerprint = _fingerprint(doc)
+        self.assertEqual(
+            _fingerprint(
+                [
+                    make_item('doc', 'Foo', keywords=[]),
+                    make_item('doc', 'Bar', keywords=[]),
+                ]
+            ),
+            fingerprint,
+        )
+        self.assertNotEqual(_fingerprint(doc[::-1]), fingerprint)
+        self.assertNotEqual(_fingerprint(doc[:1]), fingerprint)
+        moved = dataclasses.replace(
+            doc[0], snippet=dataclasses.replace(doc[0].snippet, lineno=(2, 3))
+        )
+        self.assertNotEqual(_fingerprint([moved, doc[1]]), fingerprint)
+        self.assertNotEqual(_fingerprint([]), fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from sphinxnotes.picker.utils.matching import patmatch, literal_prefix
+
+NAMES = [
+    'index',
+    'guide',
+    'guide/setup',
+    'guide/setup/linux',
+    'api/a.b',
+    'api/a-b',
+    'notes/2024/05',
+    'notes/[draft]',
+    'x^y',
+]
+PATTERNS = [
+    '**',
+    '*',
+    'guide',
+    'guide/*',
+    'guide/**',
+    'g*',
+    '*/setup',
+    '**/linux',
+    'api/a?b',
+    'api/a.b',
+    'notes/202[0-4]/*',
+    'notes/[!0-9]*',
+    'x[^]y',
+    'notes/[',
+    '?ndex',
+    'notes/*/0?',
+]
+
+
+class TestMatching(unittest.TestCase):
+    def test_patmatch(self):
+        self.assertTrue(patmatch('guide/setup', 'guide/*'))
+        self.assertFalse(patmatch('guide/setup/linux', 'guide/*'))
+        self.assertTrue(patmatch('guide/setup/linux', 'guide/**'))
+        self.assertFalse(patmatch('notes/2024/05', 'notes/[!0-9]*'))
+        self.assertFalse(patmatch('guide/setup', 'guide'))
+
+    def test_same_as_sphinx(self):
+        from sphinx.util.matching import patmatch as sphinx_patmatch
+
+        for pat in PATTERNS:
+            for name in NAMES:
+                with self.subTest(pat=pat, name=name):
+                    self.assertEqual(
+                        patmatch(name, pat), bool(sphinx_patmatch(name, pat))
+                    )
+
+    def test_literal_prefix(self):
+        self.assertEqual(literal_prefix('guide/*'), 'guide/')
+        self.assertEqual(literal_prefix('**'), '')
+        self.assertEqual(literal_prefix('notes/202[0-4]'), 'notes/202')
+        self.assertEqual(literal_prefix('a?b'), 'a')
+        self.assertEqual(literal_prefix('index'), 'index')
+
+
+if __name__ == '__main__':
+    unittest.main()
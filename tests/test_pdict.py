@@ -0,0 +1,229 @@
+import unittest
+import tempfile
+from os import path
+
+from sphinxnotes.picker.utils.pdict import PDict, BACKENDS
+
+
+class TestBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_read_write(self):
+        for name, cls in BACKENDS.items():
+            with self.subTest(backend=name):
+                backend = cls(f'{self.tmpdir.name}/{name}')
+                with backend.transaction():
+                    backend.write('blob', b'hello')
+                    backend.append('blob', b' world')
+                self.assertEqual(backend.read('blob'), b'hello world')
+                self.assertEqual(backend.read_range('blob', 1, 3), b'ell')
+
+                # Range may span appended data
+                self.assertEqual(backend.read_range('blob', 3, 5), b'lo wo')
+                self.assertEqual(backend.read_range('blob', 6, 100), b'world')
+
+                with backend.transaction():
+                    backend.write('blob', b'new')
+                self.assertEqual(backend.read('blob'), b'new')
+                self.assertEqual(backend.read_range('blob', 1, 5), b'ew')
+
+                with backend.transaction():
+                    backend.remove('blob')
+                with self.assertRaises(FileNotFoundError):
+                    backend.read('blob')
+                with self.assertRaises(FileNotFoundError):
+                    backend.mtime('blob')
+                backend.close()
+
+    def test_entries(self):
+        for name, cls in BACKENDS.items():
+            if not cls.ENTRIES:
+                continue
+            with self.subTest(backend=name):
+                backend = cls(f'{self.tmpdir.name}/{name}')
+                with backend.transaction():
+                    backend.write_entry('a', b'1')
+                    backend.write_entry('b', b'2')
+                    backend.write_entry('a', b'3')
+                self.assertEqual(sorted(backend.entries()), [b'2', b'3'])
+                with backend.transaction():
+                    backend.remove_entry('a')
+                self.assertEqual(list(backend.entries()), [b'2'])
+                with backend.transaction():
+                    backend.clear_entries()
+                self.assertEqual(list(backend.entries()), [])
+                backend.close()
+
+
+class IndexedPDict(PDict):
+    """A PDict that keeps an in-snapshot index of values, like Cache."""
+
+    def __init__(self, dirname: str, backend: str = 'pickle') -> None:
+        self.index = {}
+        super().__init__(dirname, backend)
+
+    def post_dump(self, key, value):
+        self.index[key] = value
+
+    def post_purge(self, key, value):
+        del self.index[key]
+
+    def summarize(self, key, value):
+        return value
+
+    def post_clear(self):
+        self.index = {}
+
+    def post_load(self, key, summary):
+        self.index[key] = summary
+
+
+class TestPDict(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_dump_load(self):
+        for name in BACKENDS:
+            with self.subTest(backend=name):
+                dirname = f'{self.tmpdir.name}/{name}'
+                d = PDict(dirname, name)
+                d['a'] = [1]
+                d['b'] = [2]
+                d.dump()
+
+                d = PDict(dirname, name)
+                d.load()
+                self.assertEqual(dict(d), {'a': [1], 'b': [2]})
+                self.assertTrue(d.itemname('a').endswith(PDict.ITEM_SUFFIX))
+
+    def test_journal(self):
+        dirname = self.tmpdir.name
+        d = PDict(dirname)
+        d['a'] = [1]
+        d['b'] = [2]
+        d.dump()  # Snapshot is written
+        d['a'] = [3]
+        del d['b']
+        d.dump()  # Changes are appended to journal
+        self.assertTrue(path.exists(path.join(dirname, d.journalname())))
+
+        d = PDict(dirname)
+        d.load()
+        self.assertEqual(dict(d), {'a': [3]})
+
+    def test_compaction(self):
+        dirname = self.tmpdir.name
+        d = PDict(dirname)
+        d.MIN_COMPACT_SIZE = 0
+        d['a'] = [1]
+        d['b'] = [2]
+        d.dump()
+        journalfile = path.join(dirname, d.journalname())
+        for i in range(10):
+            d['a'] = [i] * i
+            d.dump()
+            if not path.exists(journalfile):
+                break
+        else:
+            self.fail('journal is never compacted')
+
+        d = PDict(dirname)
+        d.load()
+        self.assertEqual(dict(d), {'a': [i] * i, 'b': [2]})
+
+    def test_merge_on_dump(self):
+        for name in BACKENDS:
+            with self.subTest(backend=name):
+                dirname = f'{self.tmpdir.name}/{name}'
+                d = IndexedPDict(dirname, name)
+                d['a'] = [1]
+                d['b'] = [2]
+                d['c'] = [3]
+                d.dump()
+
+                # Two builds load the same store and change it concurrently
+                d1, d2 = IndexedPDict(dirname, name), IndexedPDict(dirname, name)
+                d1.load()
+                d2.load()
+                d1['a'] = [10]
+                del d1['b']
+                d1['x'] = [11]
+                d2['c'] = [20]
+                del d2['b']  # Already purged by d1
+                d2['y'] = [21]
+                d1.dump()
+                d2.dump()
+
+                expected = {'a': [10], 'c': [20], 'x': [11], 'y': [21]}
+                self.assertEqual(dict(d2), expected)
+                d = IndexedPDict(dirname, name)
+                d.load()
+                self.assertEqual(dict(d), expected)
+                self.assertEqual(d.index, expected)
+
+    def test_stale_journal(self):
+        dirname = self.tmpdir.name
+        journalfile = path.join(dirname, IndexedPDict(dirname).journalname())
+        d = IndexedPDict(dirname)
+        d['a'] = [1]
+        d['b'] = [2]
+        d.dump()
+        d['a'] = [3]
+        del d['b']
+        d.dump()
+        with open(journalfile, 'rb') as f:
+            journal = f.read()
+
+        # Compaction is interrupted after the snapshot is written, the old
+        # journal is left
+        d.MIN_COMPACT_SIZE = 0
+        while path.exists(journalfile):
+            d['a'] = [4] * 100
+            d.dump()
+        with open(journalfile, 'wb') as f:
+            f.write(journal)
+
+        d = IndexedPDict(dirname)
+        d.load()
+        self.assertEqual(dict(d), {'a': [4] * 100})
+        self.assertEqual(d.index, {'a': [4] * 100})
+
+        # Stale journal is overwritten rather than appended
+        d['c'] = [5]
+        d.dump()
+        d = IndexedPDict(dirname)
+        d.load()
+        self.assertEqual(dict(d), {'a': [4] * 100, 'c': [5]})
+        self.assertEqual(d.index, {'a': [4] * 100, 'c': [5]})
+
+    def test_torn_journal(self):
+        dirname = self.tmpdir.name
+        d = IndexedPDict(dirname)
+        d['a'] = [1]
+        d.dump()
+        d['b'] = [2]
+        d.dump()
+        # The last record is partially written
+        with open(path.join(dirname, d.journalname()), 'ab') as f:
+            f.write(b'\x80\x04\x95torn')
+
+        d = IndexedPDict(dirname)
+        d.load()
+        self.assertEqual(dict(d), {'a': [1], 'b': [2]})
+        d['c'] = [3]
+        d.dump()
+        d['d'] = [4]
+        d.dump()
+
+        d = IndexedPDict(dirname)
+        d.load()
+        expected = {'a': [1], 'b': [2], 'c': [3], 'd': [4]}
+        self.assertEqual(dict(d), expected)
+        self.assertEqual(d.index, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
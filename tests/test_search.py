@@ -0,0 +1,89 @@
+import unittest
+import tempfile
+import math
+from os import path
+
+from sphinxnotes.picker import indexfile
+from sphinxnotes.picker.search import (
+    terms,
+    parse_query,
+    MemoryInvertedIndex,
+    search,
+    K1,
+    B,
+)
+
+
+def make_row(index_id: str, keywords: list[str]):
+    return (index_id, ('s', f'[{index_id}]', [], keywords), ('proj', index_id))
+
+
+ROWS = [
+    make_row('a', ['network', 'socket', 'network']),
+    make_row('b', ['network', 'interface', 'setup', 'guide', 'linux']),
+    make_row('c', ['backup', 'restore']),
+    make_row('d', ['wang luo', 'network']),
+]
+
+
+class TestTerms(unittest.TestCase):
+    def test_terms(self):
+        self.assertEqual(terms(['Foo', 'ni hao']), ['foo', 'ni', 'hao', 'nihao'])
+
+    def test_parse_query(self):
+        self.assertEqual(parse_query(' Foo bar  foo '), ['foo', 'bar'])
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        filename = path.join(tmpdir.name, indexfile.FILENAME)
+        indexfile.dump(filename, [(*row, ('', 0, 0, 0)) for row in ROWS], {})
+        idxfile = indexfile.IndexFile(filename)
+        self.addCleanup(idxfile.close)
+        # Index file and in-memory index must behave the same
+        self.indexes = {'file': idxfile, 'memory': MemoryInvertedIndex(ROWS)}
+
+    def search(self, query: str, limit: int = 10) -> dict[str, list]:
+        return {
+            name: [
+                (round(score, 6), row[0]) for score, row in search(index, query, limit)
+            ]
+            for name, index in self.indexes.items()
+        }
+
+    def assertSearch(self, query: str, expected: list[str], limit: int = 10):
+        for name, results in self.search(query, limit).items():
+            with self.subTest(index=name, query=query):
+                self.assertEqual([id for _, id in results], expected)
+
+    def test_ranking(self):
+        # Higher term frequency ranks higher, longer rows rank lower
+        self.assertSearch('network', ['a', 'd', 'b'])
+        # Rows matching more (and rarer) terms rank higher
+        self.assertSearch('network linux', ['b', 'a', 'd'])
+        self.assertSearch('restore', ['c'])
+        self.assertSearch('missing', [])
+        self.assertSearch('network', ['a'], limit=1)
+
+    def test_multi_word_keyword(self):
+        self.assertSearch('wangluo', ['d'])
+        self.assertSearch('WANG', ['d'])
+
+    def test_score(self):
+        lengths = [3, 5, 2, 4]
+        avg_length = sum(lengths) / len(lengths)
+        df = 1
+        idf = math.log((len(ROWS) - df + 0.5) / (df + 0.5) + 1)
+        norm = K1 * (1 - B + B * lengths[2] / avg_length)
+        expected = round(idf * 1 * (K1 + 1) / (1 + norm), 6)
+        for results in self.search('backup').values():
+            self.assertEqual(results, [(expected, 'c')])
+
+    def test_empty(self):
+        self.assertEqual(search(MemoryInvertedIndex([]), 'network', 10), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+import threading
+import socket
+from contextlib import suppress
+from os import path
+
+from sphinxnotes.picker import server
+
+
+class Stop(BaseException):
+    pass
+
+
+def handle(req: server.Request) -> server.Response:
+    if req['command'] == 'stop':
+        raise Stop()  # Not caught by server, exit serving loop
+    if req['command'] == 'fail':
+        raise ValueError('bad request')
+    return {'status': 0, 'stdout': repr(req['args']), 'stderr': ''}
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.sockpath = server.socket_path(self.tmpdir.name)
+
+    def start(self, timeout: float = 5) -> threading.Thread:
+        sock = server.listen(self.sockpath)
+
+        def run():
+            with suppress(Stop):
+                server.serve(sock, handle, timeout)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self, thread: threading.Thread) -> None:
+        with self.assertRaises(ConnectionError):
+            server.request(self.sockpath, {'command': 'stop', 'args': {}})
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_request(self):
+        thread = self.start()
+        resp = server.request(self.sockpath, {'command': 'list', 'args': {'n': 1}})
+        self.assertEqual(resp, {'status': 0, 'stdout': "{'n': 1}", 'stderr': ''})
+
+        resp = server.request(self.sockpath, {'command': 'fail', 'args': {}})
+        self.assertEqual(resp['status'], 1)
+        self.assertIn('bad request', resp['stderr'])
+
+        self.stop(thread)
+        # Socket file is removed when exiting
+        self.assertFalse(path.exists(self.sockpath))
+        with self.assertRaises(OSError):
+            server.request(self.sockpath, {'command': 'ping', 'args': {}})
+
+    def test_listen(self):
+        thread = self.start()
+        with self.assertRaises(RuntimeError):
+            server.listen(self.sockpath)
+        self.stop(thread)
+
+        # Socket file left by a dead server is replaced
+        with open(self.sockpath, 'w'):
+            pass
+        thread = self.start()
+        resp = server.request(self.sockpath, {'command': 'ping', 'args': {}})
+        self.assertEqual(resp['status'], 0)
+        self.stop(thread)
+
+    def test_timeout(self):
+        thread = self.start(timeout=0.1)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as slow:
+            slow.connect(self.sockpath)
+            # Slow client doesn't block others, its connection is dropped
+            resp = server.request(self.sockpath, {'command': 'ping', 'args': {}})
+            self.assertEqual(resp['status'], 0)
+            slow.settimeout(5)
+            self.assertEqual(slow.recv(1), b'')
+        self.stop(thread)
+
+
+if __name__ == '__main__':
+    unittest.main()
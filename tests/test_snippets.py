@@ -0,0 +1,63 @@
+import unittest
+import tempfile
+import itertools
+from os import path
+
+from sphinxnotes.picker import snippets
+from sphinxnotes.picker.snippets import source_lines_cache, _read_lines
+
+
+def reference_lines(file: str, start: int, stop: int) -> list[str]:
+    """The previous implementation that skips lines from the start of file."""
+    with open(file, 'r') as f:
+        return [line.strip('\n') for line in itertools.islice(f, start, stop)]
+
+
+class TestReadLines(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, content: str) -> str:
+        fn = path.join(self.tmpdir.name, 'doc.rst')
+        with open(fn, 'w', newline='') as f:
+            f.write(content)
+        return fn
+
+    def test_read_lines(self):
+        for content in [
+            '',
+            '\n',
+            'a',
+            'a\nb\n',
+            'a\nb',
+            'a\n\n\nb\n\n',
+            'a\r\nb\r\n',
+            'a\rb\n',
+        ]:
+            fn = self.write(content)
+            lines = _read_lines(fn)
+            for start, stop in itertools.combinations(range(7), 2):
+                with self.subTest(content=content, start=start, stop=stop):
+                    self.assertEqual(
+                        lines[start:stop], reference_lines(fn, start, stop)
+                    )
+            with self.subTest(content=content):
+                self.assertEqual(len(lines), len(reference_lines(fn, 0, None)))
+
+    def test_cache(self):
+        fn = self.write('a\nb\n')
+        with source_lines_cache():
+            self.assertEqual(_read_lines(fn), ['a', 'b'])
+            self.write('c\n')
+            # File is read once in the context
+            self.assertEqual(_read_lines(fn), ['a', 'b'])
+            with source_lines_cache():
+                self.assertEqual(_read_lines(fn), ['a', 'b'])
+            self.assertEqual(_read_lines(fn), ['a', 'b'])
+        self.assertIsNone(snippets._source_lines)
+        self.assertEqual(_read_lines(fn), ['c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import tempfile
+import os
+import json
+from types import SimpleNamespace
+
+from sphinxnotes.picker import ext
+from sphinxnotes.picker.config import Config
+from sphinxnotes.picker.utils.stats import Stats, stats
+
+
+class TestStats(unittest.TestCase):
+    def test_timer_and_count(self):
+        s = Stats()
+        for _ in range(3):
+            with s.timer('pick'):
+                pass
+        s.count('docs_picked')
+        s.count('docs_picked', 2)
+        snapshot = s.snapshot()
+        self.assertEqual(snapshot['timers']['pick']['calls'], 3)
+        self.assertGreaterEqual(snapshot['timers']['pick']['wall'], 0)
+        self.assertEqual(snapshot['counters'], {'docs_picked': 3})
+        self.assertEqual(json.loads(json.dumps(snapshot)), snapshot)
+
+        lines = s.summary()
+        self.assertTrue(lines[0].startswith('pick: '))
+        self.assertEqual(lines[-1], 'docs_picked: 3')
+
+    def test_timer_exception(self):
+        s = Stats()
+        with self.assertRaises(ValueError), s.timer('pick'):
+            raise ValueError()
+        self.assertEqual(s.timers['pick'][2], 1)
+
+    def test_merge(self):
+        main, worker = Stats(), Stats()
+        with main.timer('pick'):
+            pass
+        main.count('docs_picked')
+        with worker.timer('pick'):
+            pass
+        with worker.timer('keywords'):
+            pass
+        worker.count('docs_picked', 2)
+        worker.count('docs_skipped')
+
+        expected = main.snapshot()['timers']['pick']['wall']
+        expected += worker.snapshot()['timers']['pick']['wall']
+        main.merge(worker.snapshot())
+        snapshot = main.snapshot()
+        self.assertAlmostEqual(snapshot['timers']['pick']['wall'], expected)
+        self.assertEqual(snapshot['timers']['pick']['calls'], 2)
+        self.assertEqual(snapshot['timers']['keywords']['calls'], 1)
+        self.assertEqual(snapshot['counters'], {'docs_picked': 3, 'docs_skipped': 1})
+
+        main.reset()
+        self.assertEqual(main.snapshot(), {'timers': {}, 'counters': {}})
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        stats.reset()
+        self.addCleanup(stats.reset)
+
+    def report(self, project: str) -> None:
+        config = SimpleNamespace(
+            project=project,
+            picker_config={'cache_dir': self.tmpdir.name},
+            picker_build_report=True,
+        )
+        with self.assertLogs('sphinx.sphinxnotes.picker.ext', 'INFO'):
+            ext._report_stats(SimpleNamespace(config=config))
+
+    def test_report(self):
+        stats.count('docs_picked', 2)
+        self.report('foo')
+        stats.reset()
+        stats.count('docs_picked', 3)
+        self.report('bar')
+
+        # Every project has its own report
+        files = sorted(os.listdir(self.tmpdir.name))
+        self.assertEqual(len(files), 2)
+        for project, n in [('foo', 2), ('bar', 3)]:
+            cfg = Config({'cache_dir': self.tmpdir.name})
+            with open(ext._report_file(cfg, project)) as f:
+                report = json.load(f)
+            self.assertEqual(report['project'], project)
+            self.assertEqual(report['counters'], {'docs_picked': n})
+
+
+if __name__ == '__main__':
+    unittest.main()
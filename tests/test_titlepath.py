@@ -0,0 +1,59 @@
+import unittest
+from types import SimpleNamespace
+
+from docutils import nodes
+
+from sphinxnotes.picker.utils.titlepath import resolve_document, resolve_document_text
+
+DOCNAMES = [
+    'index',
+    'intro',
+    'guide/index',
+    'guide/setup',
+    'guide/advanced/index',
+    'guide/advanced/tuning',
+    'guide/advanced/deep/more',
+    'api/index',
+    'api/module',
+    'misc/notes',  # Directory without master doc
+    'misc/old/index',
+]
+
+
+def make_env(titled: list[str], master_doc: str = 'index'):
+    return SimpleNamespace(
+        config=SimpleNamespace(master_doc=master_doc),
+        titles={d: nodes.title(text=f'Title of {d}') for d in titled},
+    )
+
+
+class TestResolveDocument(unittest.TestCase):
+    def check(self, env):
+        memo = {}
+        for docname in DOCNAMES + DOCNAMES[::-1]:
+            with self.subTest(docname=docname):
+                expected = [t.astext() for t in resolve_document(env, docname)]
+                self.assertEqual(resolve_document_text(env, docname, memo), expected)
+
+    def test_titled(self):
+        self.check(make_env(DOCNAMES))
+
+    def test_untitled(self):
+        # Mock titles are used for directories without titled master doc
+        self.check(make_env([]))
+        self.check(make_env(['intro', 'guide/setup', 'api/index']))
+
+    def test_master_doc(self):
+        self.check(make_env(DOCNAMES, master_doc='intro'))
+
+    def test_texts(self):
+        env = make_env(['index', 'guide/index'])
+        self.assertEqual(
+            resolve_document_text(env, 'guide/advanced/tuning', {}),
+            ['Advanced', 'Title of guide/index', 'Title of index'],
+        )
+        self.assertEqual(resolve_document_text(env, 'index', {}), ['Title of index'])
+
+
+if __name__ == '__main__':
+    unittest.main()
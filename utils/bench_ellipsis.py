@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+#
+# Micro benchmark of width-aware row rendering (``picker list`` output),
+# compared with the previous implementation that re-measures the growing
+# string for every appended character.
+#
+# Usage: PYTHONPATH=src python3 utils/bench_ellipsis.py [NUM_ROWS]
+
+import sys
+import random
+import timeit
+from unittest import mock
+
+from sphinxnotes.picker import table
+from sphinxnotes.picker.utils import ellipsis
+from wcwidth import wcswidth
+
+
+def reference_ellipsis(text, width, ellipsis_sym='..', blank_sym=None):
+    text_width = wcswidth(text)
+    if text_width <= width:
+        if blank_sym:
+            text += blank_sym * ((width - text_width) // wcswidth(blank_sym))
+        return text
+    width -= wcswidth(ellipsis_sym)
+    if width > text_width:
+        width = text_width
+    i = 0
+    new_text = ''
+    while wcswidth(new_text) < width:
+        new_text += text[i]
+        i += 1
+    return new_text + ellipsis_sym
+
+
+def reference_join(
+    lst, total_width, title_width, separate_sym='/', ellipsis_sym='..', blank_sym=None
+):
+    total_width -= wcswidth(ellipsis_sym)
+    result = []
+    for i, ln in enumerate(lst):
+        ln = reference_ellipsis(ln, title_width, ellipsis_sym=ellipsis_sym)
+        l_width = wcswidth(ln) + (wcswidth(separate_sym) if i != 0 else 0)
+        if total_width - l_width < 0:
+            break
+        result.append(ln)
+        total_width -= l_width
+    s = separate_sym.join(result)
+    if blank_sym:
+        s += blank_sym * (total_width // wcswidth(blank_sym))
+    return s
+
+
+def gen_rows(n: int, alphabet: str):
+    rand = random.Random(42)
+
+    def text(k):
+        return ''.join(rand.choices(alphabet, k=k))
+
+    for i in range(n):
+        titlepath = [text(rand.randint(5, 30)) for _ in range(3)]
+        index = ('s', f'[{text(rand.randint(10, 120))}]', titlepath, ['kw'])
+        yield f'{i:07x}', index
+
+
+def bench(name: str, rows: list, width: int):
+    def render():
+        for _ in table.render(rows, width):
+            pass
+
+    new = min(timeit.repeat(render, number=1, repeat=3))
+    with (
+        mock.patch.object(ellipsis, 'ellipsis', reference_ellipsis),
+        mock.patch.object(ellipsis, 'join', reference_join),
+    ):
+        old = min(timeit.repeat(render, number=1, repeat=3))
+    print(
+        f'\t{name:10} width {width:3}: {old * 1000:8.1f} ms -> {new * 1000:7.1f} ms'
+        f'  ({old / new:.1f}x)'
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    print(f'rendering {n} rows:')
+    for name, alphabet in [
+        ('ascii', 'abcdefghijklmnopqrstuvwxyz '),
+        ('cjk', '中文标题测试文档配置安装备份恢复 '),
+    ]:
+        rows = list(gen_rows(n, alphabet))
+        for width in (80, 200):
+            bench(name, rows, width)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+#
+# Benchmark of fuzzy matcher (``picker list --query``) over synthetic indexes.
+#
+# Usage: PYTHONPATH=src python3 utils/bench_fuzzy.py [NUM_SNIPPETS]
+
+import os
+import sys
+import random
+import tempfile
+import time
+
+from sphinxnotes.picker import indexfile, fuzzy
+
+# Common words, which make most of rows match short queries
+WORDS = [
+    'install', 'configure', 'backup', 'restore', 'archive', 'server',
+    'client', 'database', 'query', 'index', 'cache', 'build', 'deploy',
+    'release', 'network', 'socket', 'thread', 'process', 'memory', 'python',
+    'sphinx', 'document', 'section', 'code', 'example', 'usage', 'reference',
+    'tutorial',
+]  # fmt: skip
+# Plus a vocabulary of rare pseudo words
+SYLLABLES = [
+    'ka', 'ri', 'to', 'mu', 'ne', 'so', 'la', 'pi',
+    'de', 'fo', 'gu', 've', 'zan', 'tor', 'mil',
+]  # fmt: skip
+QUERIES = ['restore', 'bkp', 'netsock', 'sphinx doc', 'karito', 'xyzzy']
+
+
+def gen_indexes(n: int):
+    rand = random.Random(42)
+    for i in range(n):
+        words = rand.choices(WORDS, k=2) + [
+            ''.join(rand.choices(SYLLABLES, k=rand.randint(2, 4))) for _ in range(2)
+        ]
+        title = ' '.join(words).title()
+        docname = '/'.join(rand.choices(WORDS, k=2))
+        index = (
+            rand.choice('dsc'),
+            f'[{title}]',
+            [title, docname.title(), 'Project'],
+            [docname, *title.lower().split()],
+        )
+        yield f'{i:07x}', index, ('project', docname), ('item.jsonl', 0, 0, 0)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fn = os.path.join(tmpdir, indexfile.FILENAME)
+        indexfile.dump(fn, gen_indexes(n), {})
+
+        print(f'{n} snippets, limit 20:')
+        for query in QUERIES:
+            start = time.perf_counter()
+            # Include the cost of opening index file, as every CLI call does.
+            corpus = indexfile.IndexFile(fn)
+            results = fuzzy.search(corpus, query, 20)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f'\t{query!r:14} {len(results):3} results  {elapsed:7.2f} ms')
+            corpus.close()
+
+
+if __name__ == '__main__':
+    main()